@@ -1,26 +1,215 @@
-from flask import Flask, render_template, request
+import hashlib
+import json
+import os
 
-from src.plan_trip import TripPlanner
-from src.load_data import egresses, stations, lines
+from flask import (
+    Flask,
+    Response,
+    abort,
+    jsonify,
+    make_response,
+    render_template,
+    request,
+    stream_with_context,
+)
 
+from src import metrics
+from src.batch import parse_pair, plan_pairs
+from src.fragments import line_markup, station_options
+from src.network import Network, NetworkReloader
+from src.page_cache import PageCache
+from src.results import Trip
+from src.router import Router
+from src.shared_table import TRIP_TABLE_PATH, load_trip_table
+from src.trip_table import build_trip_table
+from src.load_data import SNAPSHOT_ONLY, stations, lines, version
 
 app = Flask(__name__)
+app.add_template_global(station_options)
+app.add_template_global(line_markup)
+
+# Set WMATA_LIVE_PLANNING=1 to skip the startup table and plan every request live.
+LIVE_PLANNING = os.environ.get("WMATA_LIVE_PLANNING", "0") == "1"
+# Set WMATA_ROUTER=1 to plan transfer trips with the graph router.
+USE_ROUTER = os.environ.get("WMATA_ROUTER", "0") == "1"
+# Set WMATA_SHARED_TABLE=1 to keep the trip table in a file every worker maps.
+SHARED_TABLE = os.environ.get("WMATA_SHARED_TABLE", "0") == "1"
+router = None
+if USE_ROUTER:
+    with metrics.startup_stage("build_router"):
+        router = Router(stations, lines)
+trip_table = None
+if not LIVE_PLANNING:
+    with metrics.startup_stage("build_trip_table"):
+        if SHARED_TABLE:
+            table_path = TRIP_TABLE_PATH
+            if USE_ROUTER:
+                # One file per planning engine, so switching back needs no rebuild
+                table_path = TRIP_TABLE_PATH.replace(".bin", "_router.bin")
+            trip_table = load_trip_table(
+                f"{version}:{USE_ROUTER}", stations, lines, router, table_path
+            )
+        else:
+            trip_table = build_trip_table(stations, lines, router)
+# Request metrics should not include the planning done at startup
+metrics.reset()
+
+# Seconds between checks for changed data files; 0 never reloads.
+RELOAD_INTERVAL = float(os.environ.get("WMATA_RELOAD_INTERVAL", "0"))
+reloader = NetworkReloader(
+    Network(version, stations, lines, router, trip_table),
+    RELOAD_INTERVAL,
+    snapshot_only=SNAPSHOT_ONLY,
+)
+
+# Trip pages rendered per worker and kept in memory, most recently used first.
+RENDER_CACHE_SIZE = int(os.environ.get("WMATA_RENDER_CACHE_SIZE", "1024"))
+render_cache = PageCache(RENDER_CACHE_SIZE)
+# How long browsers and proxies may reuse a trip page without revalidating.
+CACHE_MAX_AGE = int(os.environ.get("WMATA_CACHE_MAX_AGE", "3600"))
+
+# Pages only change with their trip, the template or the planning engine
+with open(os.path.join(app.root_path, "templates", "index.html"), "rb") as f:
+    page_version = hashlib.sha256(f"{USE_ROUTER}:".encode() + f.read()).hexdigest()
+
+# Largest number of pairs accepted by /api/trips; use /api/trips.ndjson beyond that.
+MAX_BATCH_PAIRS = 10000
+# Most stations /api/stations returns for one search
+MAX_SEARCH_RESULTS = 50
+
+
+@app.before_request
+def reload_network():
+    """Swap in a new network if the data files changed since the last check."""
+    try:
+        changed = reloader.check()
+    except Exception:
+        app.logger.exception("Reloading the network failed, still serving the old one")
+        return
+    if changed is not None:
+        app.logger.info(
+            "Reloaded network %s, %d stations changed",
+            reloader.network.version[:12],
+            len(changed),
+        )
+
+
+def render_index(network: Network, start: str = None, end: str = None) -> str:
+    """Render the page, with the trip between two stations if given.
+
+    Pages are cached by the trip's version. A reload only changes the
+    versions of the trips it replanned, so every other page stays cached
+    across it, and each page is rendered from the network its version came
+    from, even if a reload swaps it in the meantime.
+    """
+
+    def render() -> str:
+        trip = None
+        if start is not None or end is not None:
+            trip = network.plan(start, end)
+        return render_page(network, trip)
+
+    return render_cache.get((start, end, network.trip_version(start, end)), render)
+
+
+@metrics.timed("render_template")
+def render_page(network: Network, trip_info: Trip) -> str:
+    """Render index.html for a planned trip, or for no trip."""
+    return render_template(
+        "index.html", stations=network.station_names, trip_info=trip_info
+    )
+
+
+def page_etag(network: Network, start: str, end: str) -> str:
+    """Strong ETag for the page of one trip."""
+    trip_version = network.trip_version(start, end)
+    return hashlib.sha256(
+        f"{page_version}:{trip_version}:{start}:{end}".encode()
+    ).hexdigest()[:32]
 
 
 @app.route("/", methods=["GET", "POST"])
 def index():
-    result = None
+    network = reloader.network
+    # Forms post the same fields the GET URLs carry
+    values = request.form if request.method == "POST" else request.args
+    start = values.get("start_station") or None
+    end = values.get("end_station") or None
+    if (start is None) != (end is None):
+        abort(400)
+    if start is not None and (
+        start not in network.stations or end not in network.stations
+    ):
+        abort(404)
     if request.method == "POST":
-        start = request.form.get("start_station")
-        end = request.form.get("end_station")
-        tp = TripPlanner(stations, lines, start, end)
-        result = tp.plan_trip()
-        # Add station to return object
-        result["start_station"] = start
-        result["end_station"] = end
-    return render_template(
-        "index.html", stations=sorted(stations.keys()), trip_info=result
-    )
+        return render_index(network, start, end)
+    etag = page_etag(network, start, end)
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = make_response(render_index(network, start, end))
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = CACHE_MAX_AGE
+    return response
+
+
+@app.route("/api/trips", methods=["POST"])
+def api_trips():
+    """Plan every pair in a JSON body of the form {"pairs": [[start, end], ...]}."""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get("pairs"), list):
+        return jsonify(error='Expected a JSON object with a "pairs" list'), 400
+    if len(payload["pairs"]) > MAX_BATCH_PAIRS:
+        return jsonify(error=f"At most {MAX_BATCH_PAIRS} pairs per request"), 413
+    try:
+        pairs = [parse_pair(item) for item in payload["pairs"]]
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    network = reloader.network
+    return jsonify(results=list(plan_pairs(pairs, network.stations, network.plan)))
+
+
+@app.route("/api/trips.ndjson", methods=["POST"])
+def api_trips_ndjson():
+    """Plan pairs sent as one JSON pair per line, streaming one result per line."""
+
+    def read_pairs():
+        for line in request.stream:
+            if line.strip():
+                yield parse_pair(json.loads(line))
+
+    network = reloader.network
+
+    def generate():
+        try:
+            for result in plan_pairs(read_pairs(), network.stations, network.plan):
+                yield json.dumps(result) + "\n"
+        except ValueError as e:
+            # Covers malformed JSON too; results already sent stay valid
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@app.route("/api/stations")
+def api_stations():
+    """Stations matching ?q=, best first, for autocomplete."""
+    query = request.args.get("q", "")
+    limit = min(request.args.get("limit", 10, type=int), MAX_SEARCH_RESULTS)
+    network = reloader.network
+    names = network.station_index.search(query, limit)
+    results = [
+        {"name": name, "lines": sorted(network.stations[name].lines)} for name in names
+    ]
+    return jsonify(query=query, results=results)
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """This worker's timings and cache statistics for Prometheus."""
+    caches = {"render": (render_cache.hits, render_cache.misses)}
+    return Response(metrics.render(caches), mimetype="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,210 @@
+"""Benchmark startup, trip planning, page rendering and memory.
+
+Run from the repository root:
+
+    python -m benchmarks.bench --output build/bench.json
+    python -m benchmarks.bench --compare build/bench-before.json
+
+Results are written as JSON so runs on different commits can be compared.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+# Run in a fresh interpreter so every import is cold. Prints one JSON object.
+STARTUP_SCRIPT = """
+import json, time, tracemalloc
+tracemalloc.start()
+timings = {}
+t = time.perf_counter()
+import pandas, numpy
+timings["import_pandas"] = time.perf_counter() - t
+t = time.perf_counter()
+import src.wmata_data
+timings["read_csv"] = time.perf_counter() - t
+from src.compile_data import get_egresses
+from src.stations import load_all_stations
+from src.lines import define_all_lines
+t = time.perf_counter()
+egresses = get_egresses()
+timings["get_egresses"] = time.perf_counter() - t
+t = time.perf_counter()
+stations = load_all_stations(egresses)
+timings["load_all_stations"] = time.perf_counter() - t
+t = time.perf_counter()
+lines = define_all_lines(stations)
+timings["define_all_lines"] = time.perf_counter() - t
+timings["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+print(json.dumps(timings))
+"""
+
+# Cold start of a serving process that loads the prebuilt snapshot.
+SNAPSHOT_SCRIPT = """
+import json, time, tracemalloc
+tracemalloc.start()
+t = time.perf_counter()
+import src.load_data
+timings = {"load_snapshot": time.perf_counter() - t}
+timings["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+print(json.dumps(timings))
+"""
+
+
+def run_script(script: str, repeat: int) -> dict:
+    """Run a timing script in fresh interpreters and keep the median of each value."""
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", script],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+
+def summarize(samples: list[float]) -> dict:
+    """Latency percentiles, in seconds."""
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "count": len(samples),
+        "mean": statistics.fmean(samples),
+        "p50": cuts[49],
+        "p90": cuts[89],
+        "p99": cuts[98],
+        "max": max(samples),
+    }
+
+
+def bench_planning(stations: dict, lines: dict, router=None) -> dict:
+    """Time TripPlanner.plan_trip over every ordered pair of stations."""
+    from src.plan_trip import TripPlanner
+
+    samples = []
+    failures = 0
+    for start in stations:
+        for end in stations:
+            t = time.perf_counter()
+            try:
+                TripPlanner(stations, lines, start, end, router).plan_trip()
+            except Exception:
+                failures += 1
+            samples.append(time.perf_counter() - t)
+    result = summarize(samples)
+    result["failures"] = failures
+    return result
+
+
+def bench_rendering(pairs: list[tuple]) -> dict:
+    """Time full GET requests for trip pages through the Flask test client."""
+    import app as app_module
+
+    client = app_module.app.test_client()
+    samples = []
+    for start, end in pairs:
+        # Measure rendering, not the page cache
+        app_module.render_cache.clear()
+        t = time.perf_counter()
+        response = client.get(
+            "/", query_string={"start_station": start, "end_station": end}
+        )
+        samples.append(time.perf_counter() - t)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {start} -> {end} returned {response.status_code}")
+    return summarize(samples)
+
+
+def git_commit() -> str:
+    """Current commit, or None outside a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(repeat: int, render_pairs: int) -> dict:
+    """Run every benchmark and collect the results."""
+    from src.lines import define_all_lines
+    from src.load_data import stations
+    from src.router import Router
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+    results["startup_build"] = run_script(STARTUP_SCRIPT, repeat)
+    results["startup_snapshot"] = run_script(SNAPSHOT_SCRIPT, repeat)
+    # Fresh lines for each pass, so no pass starts with legs another planned,
+    # and the app builds its trip table on the loaded lines untouched
+    lines = define_all_lines(stations)
+    results["plan_trip"] = bench_planning(stations, lines)
+    lines = define_all_lines(stations)
+    results["plan_trip_router"] = bench_planning(
+        stations, lines, Router(stations, lines)
+    )
+    names = sorted(stations)
+    pairs = [(start, end) for start in names for end in names]
+    step = max(1, len(pairs) // render_pairs)
+    results["render"] = bench_rendering(pairs[::step])
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    results["max_rss_bytes"] = (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    )
+    return results
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    """Flatten nested results into dotted metric names."""
+    flat = dict()
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(before: dict, after: dict):
+    """Print how each metric changed between two runs."""
+    before = flatten(before)
+    after = flatten(after)
+    for name in sorted(before.keys() & after.keys()):
+        old, new = before[name], after[name]
+        change = f"{(new - old) / old:+.1%}" if old else "n/a"
+        print(f"{name:45} {old:14.6g} {new:14.6g} {change:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="build/bench.json")
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="cold starts per startup benchmark"
+    )
+    parser.add_argument(
+        "--render-pairs", type=int, default=500, help="trip pages to render"
+    )
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.render_pairs)
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
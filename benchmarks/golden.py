@@ -0,0 +1,205 @@
+"""Record the trip for every pair of stations, and check changes against it.
+
+Run from the repository root:
+
+    python -m benchmarks.golden record
+    python -m benchmarks.golden check --engine router --loader csv
+
+record plans every ordered pair of stations and writes the results to a
+golden file, one compact JSON line per pair in sorted order. check plans
+every pair again, with the same or another engine and loader, across
+several processes, and reports each pair whose trip differs from the file.
+It exits with status 1 if any do, so it can guard a rewrite of the planner
+or of how the network is built.
+"""
+
+import argparse
+import gzip
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+
+from src.snapshot import DATA_FILES, build_network, hash_files, load_network
+
+GOLDEN_PATH = "benchmarks/golden_trips.jsonl.gz"
+
+
+def planner_engine(stations: dict, lines: dict):
+    """TripPlanner, with its two-line planning of transfer trips."""
+    from src.plan_trip import TripPlanner
+
+    def plan(start: str, end: str):
+        return TripPlanner(stations, lines, start, end).plan_trip()
+
+    return plan
+
+
+def router_engine(stations: dict, lines: dict):
+    """TripPlanner with the graph router for transfer trips."""
+    from src.plan_trip import TripPlanner
+    from src.router import Router
+
+    router = Router(stations, lines)
+
+    def plan(start: str, end: str):
+        return TripPlanner(stations, lines, start, end, router).plan_trip()
+
+    return plan
+
+
+def table_engine(stations: dict, lines: dict):
+    """Lookups in the precomputed trip table the app serves from."""
+    from src.trip_table import build_trip_table, lookup_trip
+
+    table = build_trip_table(stations, lines)
+
+    def plan(start: str, end: str):
+        return lookup_trip(table, stations, lines, start, end)
+
+    return plan
+
+
+# Each engine is built from the loaded stations and lines and returns a
+# function planning one pair; each loader returns (stations, lines).
+ENGINES = {"planner": planner_engine, "router": router_engine, "table": table_engine}
+LOADERS = {"snapshot": load_network, "csv": build_network}
+
+plan = None
+
+
+def init_worker(loader: str, engine: str):
+    """Load the network and build the engine once per worker process."""
+    global plan
+    stations, lines = LOADERS[loader]()
+    plan = ENGINES[engine](stations, lines)
+
+
+def plan_record(start: str, end: str) -> dict:
+    """The canonical record of one pair: its trip, or the error planning it."""
+    record = {"start_station": start, "end_station": end}
+    try:
+        record["trip"] = plan(start, end).to_dict()
+    except Exception as e:
+        # Only the type, as messages can differ between equivalent engines
+        record["error"] = type(e).__name__
+    return record
+
+
+def plan_start(job: tuple[str, list[str]]) -> list[dict]:
+    """Records for every pair starting at one station."""
+    start, ends = job
+    return [plan_record(start, end) for end in ends]
+
+
+def plan_all(
+    pairs: list[tuple[str, str]], loader: str, engine: str, workers: int = None
+) -> list[dict]:
+    """Records for the pairs, planned across worker processes, in order."""
+    jobs = [
+        (start, [end for _, end in group])
+        for start, group in groupby(pairs, key=lambda pair: pair[0])
+    ]
+    with ProcessPoolExecutor(
+        workers, initializer=init_worker, initargs=(loader, engine)
+    ) as executor:
+        return [record for chunk in executor.map(plan_start, jobs) for record in chunk]
+
+
+def write_golden(records: list[dict], header: dict, path: str = GOLDEN_PATH):
+    """Write the records as gzipped JSON lines after a header line."""
+    # Keys keep the order of Trip.to_dict, since the order of a leg's lines
+    # matters: the first is the line the leg is planned on
+    data = "".join(
+        json.dumps(line, separators=(",", ":")) + "\n" for line in [header] + records
+    )
+    # mtime=0 so recording the same trips again gives the same bytes
+    with open(path, "wb") as f:
+        f.write(gzip.compress(data.encode(), 9, mtime=0))
+
+
+def read_golden(path: str = GOLDEN_PATH) -> tuple[dict, list[dict]]:
+    """The header and records of a golden file."""
+    with gzip.open(path, "rt") as f:
+        lines = [json.loads(line) for line in f]
+    return lines[0], lines[1:]
+
+
+def first_difference(expected, actual, path: str = "") -> str:
+    """Describe where two JSON values first differ, or None if they are equal."""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        if set(expected) != set(actual):
+            return f"{path or '.'}: keys {sorted(expected)} != {sorted(actual)}"
+        for key in expected:
+            difference = first_difference(expected[key], actual[key], f"{path}.{key}")
+            if difference is not None:
+                return difference
+        if list(expected) != list(actual):
+            return f"{path or '.'}: key order {list(expected)} != {list(actual)}"
+        return None
+    if isinstance(expected, list) and isinstance(actual, list):
+        if len(expected) != len(actual):
+            return f"{path}: {len(expected)} items != {len(actual)}"
+        for i, (a, b) in enumerate(zip(expected, actual)):
+            difference = first_difference(a, b, f"{path}[{i}]")
+            if difference is not None:
+                return difference
+        return None
+    if expected != actual or type(expected) is not type(actual):
+        return f"{path or '.'}: {json.dumps(expected)} != {json.dumps(actual)}"
+    return None
+
+
+def record(args):
+    stations, _ = load_network()
+    names = sorted(stations)
+    pairs = [(start, end) for start in names for end in names]
+    records = plan_all(pairs, args.loader, args.engine, args.workers)
+    header = {
+        "data_version": hash_files(DATA_FILES),
+        "engine": args.engine,
+        "loader": args.loader,
+        "pairs": len(records),
+    }
+    write_golden(records, header, args.golden)
+    errors = sum("error" in r for r in records)
+    print(f"Wrote {len(records)} pairs ({errors} errors) to {args.golden}")
+
+
+def check(args) -> int:
+    header, expected = read_golden(args.golden)
+    if header["data_version"] != hash_files(DATA_FILES):
+        print("Warning: data/ changed since the golden file was recorded")
+    pairs = [(r["start_station"], r["end_station"]) for r in expected]
+    actual = plan_all(pairs, args.loader, args.engine, args.workers)
+    differences = []
+    for old, new in zip(expected, actual):
+        difference = first_difference(old, new)
+        if difference is not None:
+            differences.append((old["start_station"], old["end_station"], difference))
+    for start, end, difference in differences[: args.show]:
+        print(f"{start} -> {end}: {difference}")
+    if len(differences) > args.show:
+        print(f"... and {len(differences) - args.show} more")
+    print(
+        f"{len(differences)} of {len(expected)} pairs differ "
+        f"({args.engine} engine, {args.loader} loader, "
+        f"golden from {header['engine']} engine, {header['loader']} loader)"
+    )
+    return 1 if differences else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["record", "check"])
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="planner")
+    parser.add_argument("--loader", choices=sorted(LOADERS), default="snapshot")
+    parser.add_argument("--golden", default=GOLDEN_PATH)
+    parser.add_argument("--workers", type=int, help="processes (default: all CPUs)")
+    parser.add_argument("--show", type=int, default=20, help="differing pairs to print")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args)
+    else:
+        sys.exit(check(args))
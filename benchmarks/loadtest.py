@@ -0,0 +1,220 @@
+"""Load test the app under gunicorn on localhost.
+
+Run from the repository root:
+
+    python -m benchmarks.loadtest --workers 1 2 4 --threads 1 4
+    python -m benchmarks.loadtest --od-matrix od.csv --clients 16 --requests 20000
+
+For every combination of worker and thread counts this starts gunicorn with
+gunicorn.conf.py, replays trip page requests against / from several client
+processes, and reports throughput, latency percentiles and the error rate.
+Pairs are drawn from the OD matrix, a CSV with start_station, end_station and
+weight columns, or uniformly from every pair of stations without one. The
+draws are seeded, so each run sends the same requests in the same order.
+"""
+
+import argparse
+import csv
+import http.client
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlencode
+
+from benchmarks.bench import git_commit
+
+
+def read_od_matrix(path: str) -> tuple[list[tuple], list[float]]:
+    """Pairs and their weights from a CSV with start_station, end_station, weight."""
+    pairs = []
+    weights = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            pairs.append((row["start_station"], row["end_station"]))
+            weights.append(float(row["weight"]))
+    return pairs, weights
+
+
+def all_pairs() -> tuple[list[tuple], list[float]]:
+    """Every ordered pair of stations, equally weighted."""
+    from src.load_data import stations
+
+    names = sorted(stations)
+    pairs = [(start, end) for start in names for end in names]
+    return pairs, [1.0] * len(pairs)
+
+
+def start_server(workers: int, threads: int, port: int) -> subprocess.Popen:
+    """Start gunicorn and wait until it answers."""
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "app:app",
+            f"--workers={workers}",
+            f"--threads={threads}",
+            f"--bind=127.0.0.1:{port}",
+            "--log-level=warning",
+        ]
+    )
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {server.returncode}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/")
+            connection.getresponse().read()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("gunicorn did not start within 120s")
+
+
+def stop_server(server: subprocess.Popen):
+    """Shut gunicorn down, killing it if it does not stop within 30s."""
+    server.terminate()
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def run_client(job: tuple) -> tuple[list[float], int, float, float]:
+    """Send requests over one keep-alive connection.
+
+    Returns the latencies and error count of the measured requests, and when
+    the first of them started and the last ended.
+    """
+    port, pairs, weights, seed, requests, warmup = job
+    rng = random.Random(seed)
+    cum_weights = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cum_weights.append(total)
+    paths = [
+        "/?" + urlencode({"start_station": start, "end_station": end})
+        for start, end in rng.choices(
+            pairs, cum_weights=cum_weights, k=warmup + requests
+        )
+    ]
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    latencies = []
+    errors = 0
+    for i, path in enumerate(paths):
+        if i == warmup:
+            first_start = time.monotonic()
+        start = time.perf_counter()
+        try:
+            connection.request("GET", path)
+            response = connection.getresponse()
+            response.read()
+            failed = response.status != 200
+        except (OSError, http.client.HTTPException):
+            failed = True
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        elapsed = time.perf_counter() - start
+        if i >= warmup:
+            latencies.append(elapsed)
+            errors += failed
+    last_end = time.monotonic()
+    connection.close()
+    return latencies, errors, first_start, last_end
+
+
+def load_test(
+    port: int,
+    pairs: list[tuple],
+    weights: list[float],
+    clients: int,
+    requests: int,
+    warmup: int,
+    seed: int,
+) -> dict:
+    """Replay requests from several client processes and summarize them."""
+    per_client = requests // clients
+    jobs = [
+        (port, pairs, weights, seed + i, per_client, warmup) for i in range(clients)
+    ]
+    with ProcessPoolExecutor(clients) as executor:
+        results = list(executor.map(run_client, jobs))
+    latencies = [latency for result in results for latency in result[0]]
+    errors = sum(result[1] for result in results)
+    # From the first measured request to the last, across all clients
+    elapsed = max(result[3] for result in results) - min(
+        result[2] for result in results
+    )
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(latencies),
+        "throughput": len(latencies) / elapsed,
+        "p50": cuts[49],
+        "p95": cuts[94],
+        "p99": cuts[98],
+        "max": max(latencies),
+        "error_rate": errors / len(latencies),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1])
+    parser.add_argument("--clients", type=int, default=8, help="client processes")
+    parser.add_argument("--requests", type=int, default=5000, help="per setting")
+    parser.add_argument(
+        "--warmup", type=int, default=50, help="unmeasured requests per client"
+    )
+    parser.add_argument("--od-matrix", help="CSV of start_station,end_station,weight")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", default="build/loadtest.json")
+    args = parser.parse_args()
+
+    # gunicorn.conf.py serves from the snapshot, so make sure it is current
+    subprocess.run([sys.executable, "-m", "src.snapshot"], check=True)
+    pairs, weights = read_od_matrix(args.od_matrix) if args.od_matrix else all_pairs()
+
+    results = {"commit": git_commit(), "settings": []}
+    print(
+        f"{'workers':>7} {'threads':>7} {'req/s':>9} {'p50 ms':>8} "
+        f"{'p95 ms':>8} {'p99 ms':>8} {'errors':>7}"
+    )
+    for workers in args.workers:
+        for threads in args.threads:
+            server = start_server(workers, threads, args.port)
+            try:
+                result = load_test(
+                    args.port,
+                    pairs,
+                    weights,
+                    args.clients,
+                    args.requests,
+                    args.warmup,
+                    args.seed,
+                )
+            finally:
+                stop_server(server)
+            result.update(workers=workers, threads=threads)
+            results["settings"].append(result)
+            print(
+                f"{workers:>7} {threads:>7} {result['throughput']:>9.1f} "
+                f"{result['p50'] * 1000:>8.2f} {result['p95'] * 1000:>8.2f} "
+                f"{result['p99'] * 1000:>8.2f} {result['error_rate']:>7.2%}"
+            )
+
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
@@ -0,0 +1,205 @@
+"""Benchmark how building and planning scale with the size of the network.
+
+Run from the repository root:
+
+    python -m benchmarks.scaling --sizes 100 250 500 1000 2000 4000
+    python -m benchmarks.scaling --router --plot build/scaling.png
+
+For each size this generates a synthetic network with benchmarks.synthetic
+(about the square root of the size in lines, unless --lines is given), then
+builds it from the CSVs in a fresh process, timing each stage, and plans a
+seeded sample of station pairs with TripPlanner, and with the router if
+asked. It prints each stage's time and the planning latency percentiles,
+with how fast each grows: an exponent of 1 is linear in the number of
+stations, 2 quadratic. Results go to build/scaling.json, and to a plot if
+matplotlib is installed.
+"""
+
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+
+from benchmarks.bench import git_commit
+from benchmarks.synthetic import generate
+
+try:
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+except ImportError:
+    plt = None
+
+# Run with WMATA_DATA_DIR set to the network's CSVs. Prints one JSON object.
+NETWORK_SCRIPT = """
+import json, random, statistics, sys, time
+import pandas  # so read_csv times reading, not importing
+from src import metrics
+from src.snapshot import build_network
+from src.plan_trip import TripPlanner
+from src.router import Router
+
+num_pairs, seed, use_router = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3] == "1"
+stations, lines = build_network()
+result = {"stations": len(stations), "lines": len(lines)}
+result.update(
+    {stage: metrics.startup_durations[stage] for stage in
+     ("read_csv", "get_egresses", "load_all_stations", "define_all_lines")}
+)
+names = sorted(stations)
+rng = random.Random(seed)
+pairs = [(rng.choice(names), rng.choice(names)) for _ in range(num_pairs)]
+
+
+def time_planning(router=None):
+    latencies = []
+    failures = 0
+    for start, end in pairs:
+        t = time.perf_counter()
+        try:
+            TripPlanner(stations, lines, start, end, router).plan_trip()
+        except Exception:
+            failures += 1
+        latencies.append(time.perf_counter() - t)
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "failures": failures / len(pairs)}
+
+
+result["plan_trip"] = time_planning()
+if use_router:
+    t = time.perf_counter()
+    router = Router(stations, lines)
+    result["build_router"] = time.perf_counter() - t
+    result["plan_trip_router"] = time_planning(router)
+print(json.dumps(result))
+"""
+
+# Metrics shown in the table and plot, as paths into each result
+METRICS = [
+    ("read_csv",),
+    ("get_egresses",),
+    ("load_all_stations",),
+    ("define_all_lines",),
+    ("build_router",),
+    ("plan_trip", "p50"),
+    ("plan_trip", "p95"),
+    ("plan_trip_router", "p50"),
+    ("plan_trip_router", "p95"),
+]
+
+
+def measure(
+    size: int, num_lines: int, pairs: int, seed: int, use_router: bool, out: str
+) -> dict:
+    """Generate one network and time building and planning it."""
+    path = os.path.join(out, str(size))
+    generate(path, size, num_lines, seed)
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            NETWORK_SCRIPT,
+            str(pairs),
+            str(seed),
+            "1" if use_router else "0",
+        ],
+        env={**os.environ, "WMATA_DATA_DIR": path},
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def metric(result: dict, path: tuple) -> float:
+    for key in path:
+        result = result.get(key) if isinstance(result, dict) else None
+    return result
+
+
+def growth(results: list[dict], path: tuple) -> float:
+    """Exponent k such that the metric grows like stations**k, smallest to largest."""
+    first, last = results[0], results[-1]
+    a, b = metric(first, path), metric(last, path)
+    if not a or not b or first["stations"] == last["stations"]:
+        return None
+    return math.log(b / a) / math.log(last["stations"] / first["stations"])
+
+
+def report(results: list[dict]):
+    """Print each metric, in milliseconds, for every size."""
+    paths = [p for p in METRICS if metric(results[0], p) is not None]
+    print(
+        f"{'metric':24}"
+        + "".join(f"{r['stations']:>10}" for r in results)
+        + "   growth"
+    )
+    print(f"{'lines':24}" + "".join(f"{r['lines']:>10}" for r in results))
+    for path in paths:
+        row = f"{'.'.join(path):24}"
+        row += "".join(f"{metric(r, path) * 1000:>10.3f}" for r in results)
+        k = growth(results, path)
+        print(row + (f"   n^{k:.2f}" if k is not None else ""))
+    for name in ("plan_trip", "plan_trip_router"):
+        if name in results[0]:
+            failures = " ".join(f"{r[name]['failures']:.0%}" for r in results)
+            print(f"{name} failed for {failures} of pairs")
+
+
+def plot(results: list[dict], path: str):
+    """Log-log plot of build stages and planning latency against network size."""
+    sizes = [r["stations"] for r in results]
+    figure, (build, planning) = plt.subplots(1, 2, figsize=(12, 5))
+    for metric_path in METRICS:
+        values = [metric(r, metric_path) for r in results]
+        if None in values:
+            continue
+        axes = planning if metric_path[0].startswith("plan_trip") else build
+        axes.plot(sizes, values, marker="o", label=".".join(metric_path))
+    for axes, title in ((build, "Building the network"), (planning, "Planning")):
+        axes.set_xscale("log")
+        axes.set_yscale("log")
+        axes.set_xlabel("stations")
+        axes.set_ylabel("seconds")
+        axes.set_title(title)
+        axes.legend()
+    figure.tight_layout()
+    figure.savefig(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100, 250, 500, 1000, 2000]
+    )
+    parser.add_argument("--lines", type=int, help="lines per network")
+    parser.add_argument("--pairs", type=int, default=2000, help="pairs to plan")
+    parser.add_argument("--router", action="store_true", help="also time the router")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--networks", default="build/synthetic")
+    parser.add_argument("--output", default="build/scaling.json")
+    parser.add_argument("--plot", help="write a plot here (needs matplotlib)")
+    args = parser.parse_args()
+    if args.plot and plt is None:
+        raise SystemExit("--plot needs matplotlib: pip install matplotlib")
+
+    results = []
+    for size in args.sizes:
+        num_lines = args.lines or max(6, round(math.sqrt(size)))
+        results.append(
+            measure(size, num_lines, args.pairs, args.seed, args.router, args.networks)
+        )
+        print(f"Measured {results[-1]['stations']} stations", file=sys.stderr)
+    report(results)
+
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({"commit": git_commit(), "networks": results}, f, indent=2)
+    print(f"Wrote {args.output}")
+    if args.plot:
+        plot(results, args.plot)
+        print(f"Wrote {args.plot}")
@@ -0,0 +1,172 @@
+"""Generate a synthetic metro network as CSVs, to benchmark larger systems.
+
+Run from the repository root:
+
+    python -m benchmarks.synthetic build/synthetic --stations 2000 --lines 45
+
+Writes Stations.csv, Egresses.csv, Exits.csv, Doors.csv and Lines.csv in
+the same layout as data/, so the network builds from it with
+WMATA_DATA_DIR=build/synthetic. Lines run in groups of ROUTES_PER_TRUNK
+over a shared trunk, as the Blue, Orange and Silver lines do, each with its
+own branch at both ends. Every pair of trunks crosses at one station. The
+same seed always gives the same network.
+"""
+
+import argparse
+import csv
+import os
+import random
+
+# The icons compile_data accepts
+ICONS = ["el", "esc", "exit", "stair"]
+# Lines sharing each trunk
+ROUTES_PER_TRUNK = 3
+# Each branch is this fraction of the trunk's length
+BRANCH_SHARE = 0.25
+# Eight cars of three doors, as on a real train
+DOORS = [(car, 9 * (car - 1) + x) for car in range(1, 9) for x in (2.25, 5, 7.75)]
+
+
+def plan_routes(
+    num_stations: int, num_lines: int, rng: random.Random
+) -> tuple[list[str], dict[str : list[str]]]:
+    """Station names, and the stations of each line from west to east."""
+    num_trunks = -(-num_lines // ROUTES_PER_TRUNK)
+    # Trunks plus a branch at each end of every line add up to num_stations
+    trunk_length = max(
+        num_trunks + 2,
+        round(num_stations / (num_trunks + 2 * BRANCH_SHARE * num_lines)),
+    )
+    branch_length = max(1, round(trunk_length * BRANCH_SHARE))
+    names = iter(f"Station {i:05d}" for i in range(1, 10**6))
+
+    trunks = []
+    for t in range(num_trunks):
+        trunk = [next(names) for _ in range(trunk_length)]
+        # Cross every earlier trunk once, away from both ends
+        positions = rng.sample(range(1, trunk_length - 1), t)
+        for other, position in zip(trunks, positions):
+            crossing = rng.choice([s for s in other[1:-1] if s not in trunk])
+            trunk[position] = crossing
+        trunks.append(trunk)
+
+    routes = dict()
+    for i in range(num_lines):
+        trunk = trunks[i % num_trunks]
+        west = [next(names) for _ in range(branch_length)]
+        east = [next(names) for _ in range(branch_length)]
+        routes[f"L{i + 1:02d}"] = west + trunk + east
+    stations = sorted({s for stops in routes.values() for s in stops})
+    return stations, routes
+
+
+def station_rows(stations: list[str], routes: dict, rng: random.Random) -> list[dict]:
+    """One row of Stations.csv per station."""
+    lines_at = {s: [] for s in stations}
+    for line, stops in routes.items():
+        for s in stops:
+            lines_at[s].append(line)
+    rows = []
+    for s in stations:
+        row = {"nameStd": s, "nameAlt": "", "subtitile": ""}
+        for line in routes:
+            row[f"has{line}"] = "TRUE" if line in lines_at[s] else ""
+        row["platformType"] = rng.choices(["Island", "Side"], [3, 1])[0]
+        row["WBDir"] = "/".join(sorted({routes[line][0] for line in lines_at[s]}))
+        row["EBDir"] = "/".join(sorted({routes[line][-1] for line in lines_at[s]}))
+        row["compassN"] = "n"
+        rows.append(row)
+    return rows
+
+
+def egress_rows(
+    stations: list[dict], routes: dict, rng: random.Random
+) -> tuple[list[dict], list[dict]]:
+    """Rows of Egresses.csv and Exits.csv for every station."""
+    egresses = []
+    exits = []
+    for station in stations:
+        name = station["nameStd"]
+        lines = [line for line in routes if station[f"has{line}"]]
+        num_exits = rng.randint(1, 3)
+        for label in range(1, num_exits + 1):
+            exits.append(
+                {"nameStd": name, "exitLabel": label, "description": f"Exit {label}"}
+            )
+        for _ in range(rng.randint(3, 6)):
+            egresses.append(egress_row(name, station["platformType"], num_exits, rng))
+        if len(lines) > 1:
+            # Transfer points to each other line, some for one direction only
+            for line in lines:
+                row = egress_row(name, station["platformType"], 0, rng)
+                row["transfer"] = "TRUE"
+                row["lines"] = f"[{line}]"
+                terminus = rng.choice([None, routes[line][0], routes[line][-1]])
+                row["direction"] = f"[{terminus}]" if terminus else "both"
+                egresses.append(row)
+    return egresses, exits
+
+
+def egress_row(name: str, platform: str, num_exits: int, rng: random.Random) -> dict:
+    """An elevator, escalator, stairway or exit somewhere along the platform."""
+    label = rng.randint(1, num_exits) if num_exits > 1 else ""
+    return {
+        "nameStd": name,
+        "icon": rng.choice(ICONS),
+        # Side platforms have one direction per platform, by y
+        "y": rng.randint(1, 2) if platform == "Side" else 2,
+        "x": rng.randint(1, 71),
+        "dir": rng.choice(["nw", "ne", ""]),
+        "zDir": rng.choice(["u", "d", ""]),
+        "pref": "TRUE" if rng.random() < 0.1 else "",
+        "x2": "",
+        "exitLabel": label,
+        "group": "",
+        "transfer": "",
+        "lines": "",
+        "direction": "",
+    }
+
+
+def write_csv(path: str, rows: list[dict], columns: list[str]):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def generate(out: str, num_stations: int, num_lines: int, seed: int = 0):
+    """Write a synthetic network of about num_stations stations to out."""
+    rng = random.Random(seed)
+    stations, routes = plan_routes(num_stations, num_lines, rng)
+    station_table = station_rows(stations, routes, rng)
+    egresses, exits = egress_rows(station_table, routes, rng)
+    os.makedirs(out, exist_ok=True)
+    write_csv(os.path.join(out, "Stations.csv"), station_table, list(station_table[0]))
+    write_csv(os.path.join(out, "Egresses.csv"), egresses, list(egresses[0]))
+    write_csv(
+        os.path.join(out, "Exits.csv"), exits, ["nameStd", "exitLabel", "description"]
+    )
+    write_csv(
+        os.path.join(out, "Doors.csv"),
+        [{"Car": car, "x": x} for car, x in DOORS],
+        ["Car", "x"],
+    )
+    write_csv(
+        os.path.join(out, "Lines.csv"),
+        [{"line": line, "station": s} for line, stops in routes.items() for s in stops],
+        ["line", "station"],
+    )
+    return len(stations), len(routes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("out", help="directory to write the CSVs to")
+    parser.add_argument("--stations", type=int, default=1000)
+    parser.add_argument("--lines", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stations, lines = generate(args.out, args.stations, args.lines, args.seed)
+    print(f"Wrote {stations} stations on {lines} lines to {args.out}")
@@ -0,0 +1,30 @@
+"""gunicorn settings for serving many workers from one copy of the network.
+
+gunicorn reads this file from the working directory, so from the repository
+root run:
+
+    python -m src.snapshot
+    gunicorn app:app
+
+The app is imported once in the master (preload_app), which maps the trip
+table file and loads the network snapshot before forking. Workers then read
+the trip table straight from the shared mapping, and gc.freeze() keeps the
+garbage collector from touching, and so copying, the objects built before
+the fork.
+"""
+
+import gc
+import os
+
+# Defaults for the app, which reads them when the master imports it
+os.environ.setdefault("WMATA_SHARED_TABLE", "1")
+os.environ.setdefault("WMATA_SNAPSHOT_ONLY", "1")
+
+bind = os.environ.get("WMATA_BIND", "127.0.0.1:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", "4"))
+preload_app = True
+
+
+def pre_fork(server, worker):
+    """Move everything the master has built out of the collector's reach."""
+    gc.freeze()
@@ -0,0 +1,48 @@
+"""Plan trips for many pairs of stations at once."""
+
+from collections.abc import Callable, Iterable, Iterator
+
+from src.results import Trip
+
+
+def parse_pair(item) -> tuple[str, str]:
+    """Read a pair given as [start, end] or {"start_station": ..., "end_station": ...}."""
+    if isinstance(item, dict):
+        item = (item.get("start_station"), item.get("end_station"))
+    if (
+        not isinstance(item, (list, tuple))
+        or len(item) != 2
+        or not all(isinstance(name, str) for name in item)
+    ):
+        raise ValueError(f"Expected a pair of station names, got {item!r}")
+    return item[0], item[1]
+
+
+def plan_pairs(
+    pairs: Iterable[tuple[str, str]],
+    stations: dict,
+    plan: Callable[[str, str], Trip],
+) -> Iterator[dict]:
+    """Yield one result per pair, in order, planning each distinct pair only once.
+
+    Each result holds the two station names and either the planned "trip", in
+    the form of Trip.to_dict, or an "error" message.
+    """
+    planned = dict()
+    for start, end in pairs:
+        if (start, end) in planned:
+            yield planned[(start, end)]
+            continue
+        result = {"start_station": start, "end_station": end}
+        unknown = [name for name in (start, end) if name not in stations]
+        if unknown:
+            result["error"] = f"Unknown station: {unknown[0]}"
+            yield result
+            continue
+        try:
+            result["trip"] = plan(start, end).to_dict()
+        except Exception as e:
+            result["error"] = f"Could not plan trip: {e}"
+        # Only known stations are remembered, so this is bounded by the network
+        planned[(start, end)] = result
+        yield result
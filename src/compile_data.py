@@ -0,0 +1,389 @@
+"""Compile Egress objects from the CSV data.
+
+This is the only part of the app that needs pandas and numpy. It runs offline
+(or when the network snapshot is stale); serving only needs its output. The
+CSVs are checked here, and text fields such as transfer lines and directions
+are parsed into lists once, so Egress objects are built from clean values.
+
+    python -m src.compile_data
+
+checks the data and lists every bad row with its line number.
+"""
+
+from src.wmata_data import (
+    DOORS_CSV,
+    EGRESSES_CSV,
+    EXITS_CSV,
+    LINES_CSV,
+    STATIONS_CSV,
+    doors,
+    egresses,
+    exits,
+    lines,
+    stations,
+)
+from src.egresses import Egress
+from src.metrics import startup_stage
+import pandas as pd
+import numpy as np
+
+label_stations = set()
+
+direction = {1: "eastbound", 2: "westbound"}
+# Platform types with one direction per platform, given by y
+SIDE_PLATFORMS = ["Gap Island", "Side"]
+
+ICONS = {"el", "esc", "exit", "stair"}
+# Line codes, in the order the lines file first lists them
+LINES = list(dict.fromkeys(lines["line"])) if "line" in lines.columns else []
+# Transfer lines such as "[GR, YL]", and transfer directions such as
+# "[Branch Avenue, Huntington]" or "both"
+LINE_LIST = r"\[(?:{0})(?:, (?:{0}))*\]".format("|".join(LINES))
+NAME_LIST = r"\[[^,\[\]]+(?:, [^,\[\]]+)*\]"
+# Stations with two platform levels are listed once per level
+LEVEL_SUFFIX = r" \((?:Lower|Upper) Level\)$"
+
+
+class DataError(ValueError):
+    """The CSV data has rows that cannot be compiled."""
+
+    def __init__(self, errors: list[str]):
+        super().__init__("\n".join(errors))
+        self.errors = errors
+
+
+def find_errors(frame: pd.DataFrame, path: str, checks: list[tuple]) -> list[str]:
+    """Describe every row failing a check, with its line number in the CSV.
+
+    Each check is a (column, bad_rows, message) tuple, where bad_rows is a
+    boolean Series and message describes the problem.
+    """
+    errors = []
+    for column, bad_rows, message in checks:
+        for index in frame.index[bad_rows.to_numpy(dtype=bool)]:
+            value = frame.at[index, column]
+            errors.append((index, f"{column} '{value}' {message}"))
+    # Line 1 is the header
+    return [f"{path} line {index + 2}: {error}" for index, error in sorted(errors)]
+
+
+def missing_columns(frame: pd.DataFrame, path: str, columns: list[str]) -> list[str]:
+    """Describe each required column the CSV does not have."""
+    return [f"{path}: missing column {c}" for c in columns if c not in frame.columns]
+
+
+def is_number(column: pd.Series) -> pd.Series:
+    """Which values are numbers."""
+    return pd.to_numeric(column, errors="coerce").notna()
+
+
+def is_flag(column: pd.Series) -> pd.Series:
+    """Flags are either TRUE or left empty."""
+    # As text, since one bad cell makes pandas read the whole column as strings
+    return column.isna() | column.astype(str).str.strip().str.upper().eq("TRUE")
+
+
+def as_text(column: pd.Series) -> pd.Series:
+    """Values as stripped strings, with whole numbers written without a ".0"."""
+    return column.map(
+        lambda v: str(int(v)) if isinstance(v, float) and v.is_integer() else str(v)
+    ).str.strip()
+
+
+def validate():
+    """Check the CSV data, raising DataError listing every bad row."""
+    errors = (
+        missing_columns(
+            stations,
+            STATIONS_CSV,
+            ["nameStd", "nameAlt", "subtitile", "platformType"]
+            + [f"has{line}" for line in LINES],
+        )
+        + missing_columns(doors, DOORS_CSV, ["Car", "x"])
+        + missing_columns(exits, EXITS_CSV, ["nameStd", "exitLabel"])
+        + missing_columns(
+            egresses,
+            EGRESSES_CSV,
+            ["nameStd", "icon", "y", "x", "pref", "exitLabel"]
+            + ["transfer", "lines", "direction"],
+        )
+        + missing_columns(lines, LINES_CSV, ["line", "station"])
+    )
+    if errors:
+        raise DataError(errors)
+
+    station_names = stations["nameStd"]
+    # Both levels of a station count as the one station lines list
+    line_station_names = station_names.str.replace(LEVEL_SUFFIX, "", regex=True)
+    line_stops = set(zip(lines["line"], lines["station"]))
+    flagged_stops = {
+        (line, name)
+        for line in LINES
+        for name in line_station_names[stations[f"has{line}"].notna()]
+    }
+    errors += find_errors(
+        stations,
+        STATIONS_CSV,
+        [("nameStd", station_names.duplicated(), "is listed more than once")]
+        + [
+            (
+                f"has{line}",
+                stations[f"has{line}"].notna()
+                & ~line_station_names.map(lambda name: (line, name) in line_stops),
+                f"is set but the station is not on {line} in {LINES_CSV}",
+            )
+            for line in LINES
+        ],
+    )
+    errors += find_errors(
+        lines,
+        LINES_CSV,
+        [
+            (
+                "station",
+                ~lines["station"].isin(line_station_names),
+                "is not a station",
+            ),
+        ]
+        + [
+            (
+                "station",
+                lines["line"].eq(line)
+                & lines["station"].isin(line_station_names)
+                & ~lines["station"].map(lambda name: (line, name) in flagged_stops),
+                f"is on {line} but has{line} is not set in {STATIONS_CSV}",
+            )
+            for line in LINES
+        ]
+        + [
+            (
+                "station",
+                lines.duplicated(["line", "station"]),
+                "is listed more than once on the line",
+            ),
+        ],
+    )
+    errors += find_errors(
+        doors,
+        DOORS_CSV,
+        [
+            ("Car", ~is_number(doors["Car"]), "is not a number"),
+            ("x", ~is_number(doors["x"]), "is not a number"),
+        ],
+    )
+    errors += find_errors(
+        exits,
+        EXITS_CSV,
+        [
+            ("nameStd", ~exits["nameStd"].isin(station_names), "is not a station"),
+            (
+                "exitLabel",
+                exits.duplicated(["nameStd", "exitLabel"]),
+                "is listed more than once for the station",
+            ),
+        ],
+    )
+    # Labels read as numbers in one file can be read as strings in the other
+    exit_keys = set(zip(exits["nameStd"], as_text(exits["exitLabel"])))
+    has_label = egresses["exitLabel"].notna()
+    unknown_label = has_label & pd.Series(
+        [
+            (name, label) not in exit_keys
+            for name, label in zip(egresses["nameStd"], as_text(egresses["exitLabel"]))
+        ],
+        index=egresses.index,
+    )
+    transfer_lines = egresses["lines"].astype(object)
+    transfer_direction = egresses["direction"].astype(object)
+    has_lines = transfer_lines.notna()
+    has_direction = transfer_direction.notna()
+    platform_types = dict(zip(station_names, stations["platformType"]))
+    on_side_platform = egresses["nameStd"].map(platform_types).isin(SIDE_PLATFORMS)
+    y = pd.to_numeric(egresses["y"], errors="coerce")
+    errors += find_errors(
+        egresses,
+        EGRESSES_CSV,
+        [
+            ("nameStd", ~egresses["nameStd"].isin(station_names), "is not a station"),
+            ("icon", ~egresses["icon"].isin(ICONS), f"is not one of {sorted(ICONS)}"),
+            ("x", ~is_number(egresses["x"]), "is not a number"),
+            ("y", ~is_number(egresses["y"]), "is not a number"),
+            (
+                "y",
+                on_side_platform & y.notna() & ~y.isin(direction),
+                "should be 1 or 2 on a side platform",
+            ),
+            ("pref", ~is_flag(egresses["pref"]), "should be TRUE or empty"),
+            ("transfer", ~is_flag(egresses["transfer"]), "should be TRUE or empty"),
+            ("exitLabel", unknown_label, f"is not in {EXITS_CSV} for the station"),
+            (
+                "lines",
+                has_lines & ~transfer_lines.astype(str).str.fullmatch(LINE_LIST),
+                f"should be a list of {', '.join(LINES)} like [GR, YL]",
+            ),
+            (
+                "lines",
+                has_lines & egresses["transfer"].isna(),
+                "is given but transfer is not set",
+            ),
+            (
+                "direction",
+                has_direction
+                & transfer_direction.ne("both")
+                & ~transfer_direction.astype(str).str.fullmatch(NAME_LIST),
+                "should be both or a list of termini like [Glenmont, Shady Grove]",
+            ),
+            ("direction", has_direction & ~has_lines, "is given but lines is not"),
+        ],
+    )
+    if errors:
+        raise DataError(errors)
+
+
+def parse_list(value) -> list[str]:
+    """Items of a list written as "[a, b]", or None if missing."""
+    if pd.isna(value):
+        return None
+    return [item.strip() for item in value[1:-1].split(",")]
+
+
+def none_if_na(value):
+    """Replace pandas missing values with None."""
+    if pd.isna(value):
+        return None
+    return value
+
+
+def build_door_table() -> pd.DataFrame:
+    """Doors sorted by x position, with their number within the car."""
+    table = doors.assign(door=doors.groupby("Car").cumcount() + 1)
+    return table.sort_values("x", kind="stable").reset_index(drop=True)
+
+
+door_table = build_door_table()
+
+
+def find_doors(x: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """Get car and door # of the nearest door to each x position.
+
+    A position exactly halfway between two doors gets the one further back
+    along the train (the larger x).
+    """
+    x = np.asarray(x, dtype=float)
+    door_x = door_table["x"].to_numpy()
+    # Nearest door is one of the two doors either side of each position
+    after = np.clip(np.searchsorted(door_x, x), 1, len(door_x) - 1)
+    before = after - 1
+    nearest = np.where(door_x[after] - x <= x - door_x[before], after, before)
+    return (
+        door_table["Car"].to_numpy()[nearest],
+        door_table["door"].to_numpy()[nearest],
+    )
+
+
+def get_egresses() -> list[Egress]:
+    """Get all egresses from Pandas dataframe of egresses."""
+    with startup_stage("get_egresses.validate"):
+        validate()
+    frame = build_egress_frame()
+    with startup_stage("get_egresses.door_lookup"):
+        cars, door_numbers = find_doors(frame["x"])
+    with startup_stage("get_egresses.make_egresses"):
+        result = []
+        for row, car, door in zip(frame.itertuples(index=False), cars, door_numbers):
+            result.append(
+                Egress(
+                    row.station,
+                    row.icon,
+                    int(car),
+                    int(door),
+                    row.platform_dir,
+                    row.label,
+                    set(row.station_lines),
+                    row.preferred,
+                    none_if_na(row.transfer),
+                    row.transfer_lines,
+                    row.transfer_direction,
+                )
+            )
+    return result
+
+
+def get_station_lines() -> pd.Series:
+    """Find all the lines that exist at each station, indexed by station name."""
+    has_line = stations.set_index("nameStd")[[f"has{l}" for l in LINES]].notna()
+    has_line.columns = LINES
+    return has_line.apply(
+        lambda row: frozenset(row.index[row.to_numpy(dtype=bool)]), axis=1
+    )
+
+
+def get_station_aliases() -> dict[str : tuple[str]]:
+    """Other names of each station, from the nameAlt and subtitile columns."""
+    aliases = dict()
+    names = stations["nameStd"].str.replace(LEVEL_SUFFIX, "", regex=True)
+    for name, alt, subtitle in zip(names, stations["nameAlt"], stations["subtitile"]):
+        found = aliases.setdefault(name, [])
+        for alias in (alt, subtitle):
+            if not pd.isna(alias) and alias not in found:
+                found.append(alias)
+    return {name: tuple(found) for name, found in aliases.items()}
+
+
+def build_egress_frame() -> pd.DataFrame:
+    """Join egresses with their station and exit information in one pass."""
+    with startup_stage("get_egresses.station_join"):
+        frame = join_stations(egresses)
+    with startup_stage("get_egresses.label_lookup"):
+        frame = lookup_labels(frame)
+    with startup_stage("get_egresses.transfer_parsing"):
+        parse_transfers(frame)
+    return frame
+
+
+def join_stations(frame: pd.DataFrame) -> pd.DataFrame:
+    """Add each egress's station name, lines and platform direction."""
+    frame = frame.merge(
+        stations[["nameStd", "platformType"]],
+        on="nameStd",
+        how="left",
+        validate="many_to_one",
+    )
+    side_platform = frame["platformType"].isin(SIDE_PLATFORMS)
+    frame["platform_dir"] = pd.Series(
+        np.where(side_platform, frame["y"].map(direction), None), dtype=object
+    )
+    frame["station_lines"] = frame["nameStd"].map(get_station_lines())
+    frame["preferred"] = frame["pref"].eq(True)
+    frame["station"] = frame["nameStd"].str.replace(LEVEL_SUFFIX, "", regex=True)
+    return frame
+
+
+def lookup_labels(frame: pd.DataFrame) -> pd.DataFrame:
+    """Add the description of each egress's exit as its label."""
+    frame = frame.merge(
+        exits[["nameStd", "exitLabel", "description"]],
+        on=["nameStd", "exitLabel"],
+        how="left",
+        validate="many_to_one",
+    )
+    has_label = frame["description"].notna()
+    label_stations.update(frame.loc[has_label, "nameStd"])
+    frame["label"] = frame["description"].where(has_label, "Main Exit")
+    return frame
+
+
+def parse_transfers(frame: pd.DataFrame):
+    """Parse the transfer lines and directions into lists, in place."""
+    frame["transfer_lines"] = frame["lines"].map(parse_list)
+    frame["transfer_direction"] = frame["direction"].map(
+        lambda value: value if value == "both" else parse_list(value)
+    )
+
+
+if __name__ == "__main__":
+    try:
+        result = get_egresses()
+    except DataError as e:
+        raise SystemExit(f"{len(e.errors)} problem(s) in the data:\n{e}")
+    print(f"{len(result)} egresses at {len({e.station for e in result})} stations")
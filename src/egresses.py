@@ -1,26 +1,7 @@
 """Defining Exits."""
 
-from src.wmata_data import doors, egresses, exits, stations
-import pandas as pd
-import numpy as np
-import re
-
-LINES = ["RD", "GR", "YL", "BL", "SV", "OR"]
-
-label_stations = set()
-
-
-def get_lines_at_station(station_name: str) -> list[str]:
-    """Find all the lines that exist at a given station."""
-    lines_at_station = set()
-    for l in LINES:
-        station = stations.loc[stations["nameStd"] == station_name, f"has{l}"].item()
-        if pd.notna(station):
-            lines_at_station.add(l)
-    return lines_at_station
-
-
-direction = {1: "eastbound", 2: "westbound"}
+import sys
+from array import array
 
 
 class Egress:
@@ -30,19 +11,20 @@ class Egress:
         self,
         station: str,
         icon: str,
-        x: float,
+        car: int,
+        door: int,
         dir: str,
         label: str,
         lines: list[str],
         preferred: str,
         transfer: bool,
-        transfer_lines: str,
-        transfer_direction: str,
+        transfer_lines: list[str],
+        transfer_direction: list[str],
     ):
-        self.station = re.sub(r" \((Lower|Upper) Level\)$", "", station)
+        self.station = station
         self.icon = icon
-        # Define car/door position
-        self.get_door(x)
+        self.car = car
+        self.door = door
         self.dir = dir
         self.label = label
         self.lines = lines
@@ -50,43 +32,19 @@ class Egress:
         self.get_transfer_information(transfer, transfer_lines, transfer_direction)
 
     def get_transfer_information(
-        self, transfer: bool, transfer_lines: str, transfer_direction: str
+        self, transfer: bool, transfer_lines: list[str], transfer_direction: list[str]
     ):
-        """Store transfer information."""
-        if pd.isna(transfer):
-            self.transfer = None
-            self.transfer_lines = None
-            self.transfer_direction = None
-        elif pd.isna(transfer_lines):
-            self.transfer = transfer
-            self.transfer_lines = None
-            self.transfer_direction = None
-        elif pd.isna(transfer_direction):
-            self.transfer = transfer
-            self.transfer_lines = re.findall(r"\b[A-Z]{2}\b", transfer_lines)
+        """Store transfer information.
+
+        transfer_direction is a list of termini or "both". Lines only count
+        for a transfer, and directions only for transfer lines.
+        """
+        self.transfer = transfer
+        self.transfer_lines = transfer_lines if transfer is not None else None
+        if self.transfer_lines is None:
             self.transfer_direction = None
         else:
-            self.transfer = transfer
-            self.transfer_lines = re.findall(r"\b[A-Z]{2}\b", transfer_lines)
-            if transfer_direction == "both":
-                self.transfer_direction = transfer_direction
-            else:
-                self.transfer_direction = [
-                    x.strip()
-                    for x in re.search(r"\[([^\]]+)\]", transfer_direction)
-                    .group(1)
-                    .split(",")
-                ]
-
-    def get_door(self, x: float):
-        """Get car and door # from x position."""
-        differences = np.abs(doors["x"] - x)
-        nearest_index = differences.argsort()[0]
-        row = doors.iloc[nearest_index]
-        car = row["Car"]
-        position = doors[doors["Car"] == car].index.get_loc(row.name) + 1
-        self.car = int(car.item())
-        self.door = position
+            self.transfer_direction = transfer_direction
 
     def is_transfer(self, transfer_line: str, direction: str) -> bool:
         """Returns whether this egress is a transfer point for given line and direction."""
@@ -118,57 +76,140 @@ class Egress:
         return exit_info
 
 
-def get_egresses() -> list[Egress]:
-    """Get all egresses from Pandas dataframe of egresses."""
-    result = egresses.apply(get_one_egress, axis=1)
-    return result.to_list()
-
-
-def get_one_egress(row: pd.Series) -> Egress:
-    """Create an Egress object from one row of egress (pandas)."""
-    station = row["nameStd"]
-    station_row = stations[stations["nameStd"] == station]
-    if station_row["platformType"].item() in ["Gap Island", "Side"]:
-        dir = direction[row["y"]]
-    else:
-        dir = None
-    icon = row["icon"]
-    x = row["x"]
-    label = exits.loc[
-        (exits["nameStd"] == station) & (exits["exitLabel"] == row["exitLabel"]),
-        "description",
-    ]
-
-    if len(label) > 0:
-        label = label.item()
-        label_stations.add(station)
-    else:
-        label = "Main Exit"
-    lines = get_lines_at_station(station)
-    preferred = False
-    if row["pref"] == True:
-        preferred = True
-    transfer = row["transfer"]
-    transfer_lines = row["lines"]
-    transfer_direction = row["direction"]
-    if pd.notna(transfer_lines):
-        transfer_lines = (
-            transfer_lines.replace("[", "['").replace("]", "']").replace(", ", "', '")
+# Platform direction codes used by EgressTable; 0 means both directions
+DIRECTIONS = (None, "eastbound", "westbound")
+# Transfer direction bit that only "both" sets, for termini not in the table
+ANY_DIRECTION = 1 << 63
+ALL_DIRECTIONS = (1 << 64) - 1
+
+
+class EgressTable:
+    """The egresses of one station, stored column by column.
+
+    Each distinct icon, label, line and transfer terminus is stored once and
+    referred to by a small integer code. The byte-sized columns share one
+    array, and lines and transfer directions are bitmasks in another, so
+    picking the egresses for a train is one pass over integers rather than a
+    method call per Egress object.
+    """
+
+    __slots__ = ("icons", "labels", "lines", "termini", "size", "bytes", "masks")
+
+    # Columns of self.bytes, each self.size long
+    ICON, LABEL, DIR, CAR, DOOR, PREFERRED = range(6)
+    # Columns of self.masks
+    LINES, TRANSFER_LINES, TRANSFER_DIRECTIONS = range(3)
+
+    def __init__(self, egresses: list[Egress]):
+        self.icons = []
+        self.labels = []
+        self.lines = []
+        self.termini = []
+        self.size = len(egresses)
+        byte_columns = [[] for _ in range(6)]
+        mask_columns = [[] for _ in range(3)]
+        for egress in egresses:
+            byte_columns[self.ICON].append(self.code(self.icons, egress.icon))
+            byte_columns[self.LABEL].append(self.code(self.labels, egress.label))
+            byte_columns[self.DIR].append(DIRECTIONS.index(egress.dir))
+            byte_columns[self.CAR].append(egress.car)
+            byte_columns[self.DOOR].append(egress.door)
+            byte_columns[self.PREFERRED].append(bool(egress.preferred))
+            mask_columns[self.LINES].append(self.mask(self.lines, sorted(egress.lines)))
+            mask_columns[self.TRANSFER_LINES].append(
+                self.mask(self.lines, egress.transfer_lines)
+            )
+            if egress.transfer_direction == "both":
+                directions = ALL_DIRECTIONS
+            else:
+                directions = self.mask(self.termini, egress.transfer_direction)
+            mask_columns[self.TRANSFER_DIRECTIONS].append(directions)
+        if len(self.lines) > 64 or len(self.termini) > 63:
+            raise ValueError(f"Too many lines or termini at {egresses[0].station}")
+        self.bytes = array("B", [value for column in byte_columns for value in column])
+        self.masks = array("Q", [value for column in mask_columns for value in column])
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, EgressTable):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
         )
-    one_egress = Egress(
-        station,
-        icon,
-        x,
-        dir,
-        label,
-        lines,
-        preferred,
-        transfer,
-        transfer_lines,
-        transfer_direction,
-    )
-    return one_egress
-
-
-if __name__ == "__main__":
-    result = get_egresses()
+
+    def code(self, values: list, value) -> int:
+        """Code of a value in one of the lookup lists, adding it if new."""
+        if value not in values:
+            # Interned so every table shares one copy of each string
+            values.append(sys.intern(value) if isinstance(value, str) else value)
+        return values.index(value)
+
+    def mask(self, values: list, items) -> int:
+        """Bitmask of items, by their code in one of the lookup lists."""
+        mask = 0
+        for item in items or ():
+            mask |= 1 << self.code(values, item)
+        return mask
+
+    def bit(self, values: list, value, missing: int = 0) -> int:
+        """Bit of a value in one of the lookup lists, or missing if absent."""
+        if value in values:
+            return 1 << values.index(value)
+        return missing
+
+    def select(
+        self,
+        direction: str,
+        line: str,
+        transfer: bool = False,
+        transfer_line: str = None,
+        transfer_direction: str = None,
+    ) -> list[int]:
+        """Rows usable from a train on the line heading in the direction.
+
+        With transfer, only rows that are transfer points to the transfer line
+        and direction are kept, as in Egress.is_transfer.
+        """
+        size = self.size
+        masks = self.masks
+        dirs = self.bytes
+        dir_offset = self.DIR * size
+        line_bit = self.bit(self.lines, line)
+        direction_code = DIRECTIONS.index(direction)
+        rows = [
+            i
+            for i in range(size)
+            if masks[i] & line_bit and dirs[dir_offset + i] in (0, direction_code)
+        ]
+        if transfer:
+            line_offset = self.TRANSFER_LINES * size
+            direction_offset = self.TRANSFER_DIRECTIONS * size
+            line_bit = self.bit(self.lines, transfer_line)
+            direction_bit = self.bit(self.termini, transfer_direction, ANY_DIRECTION)
+            rows = [
+                i
+                for i in rows
+                if masks[line_offset + i] & line_bit
+                and masks[direction_offset + i] & direction_bit
+            ]
+        return rows
+
+    def get_exit_info(self, rows: list[int], direction: str) -> list[dict]:
+        """Information for the rows, each in the format of Egress.get_exit_info."""
+        size = self.size
+        values = self.bytes
+        flip = direction == "eastbound"
+        exit_infos = []
+        for row in rows:
+            car = values[self.CAR * size + row]
+            door = values[self.DOOR * size + row]
+            exit_info = dict()
+            exit_info["preferred"] = bool(values[self.PREFERRED * size + row])
+            exit_info["label"] = self.labels[values[self.LABEL * size + row]]
+            exit_info["icon"] = self.icons[values[self.ICON * size + row]]
+            exit_info["car"] = 9 - car if flip else car
+            exit_info["door"] = 4 - door if flip else door
+            exit_infos.append(exit_info)
+        return exit_infos
@@ -0,0 +1,33 @@
+"""Pieces of index.html built once and reused by every render.
+
+The station lists and the coloured line markup only change with the network,
+so they are rendered here once per distinct input and passed to the template
+as ready-made markup, rather than looped over in Jinja on every request.
+"""
+
+from functools import lru_cache
+
+from markupsafe import Markup, escape
+
+
+@lru_cache(maxsize=512)
+def station_options(station_names: tuple[str], selected: str = None) -> Markup:
+    """<option> elements for every station, with selected marked as chosen."""
+    options = ['<option value="">Select a station</option>']
+    for name in station_names:
+        chosen = " selected" if name == selected else ""
+        name = escape(name)
+        options.append(f'<option value="{name}"{chosen}>{name}</option>')
+    return Markup("\n".join(options))
+
+
+@lru_cache(maxsize=None)
+def line_markup(lines: tuple[tuple[str, str]]) -> tuple[Markup, Markup]:
+    """The codes of a leg's lines and the termini they head to, in line colours."""
+    codes = []
+    directions = []
+    for code, direction in lines:
+        code = escape(code)
+        codes.append(f'<strong class="{code}">{code} </strong>')
+        directions.append(f'<strong class="{code}">{escape(direction)} </strong>')
+    return Markup("/ ".join(codes)), Markup("/ ".join(directions))
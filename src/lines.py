@@ -1,8 +1,16 @@
 """The WMATA Lines as objects."""
 
+import csv
+import os
 from collections import defaultdict
+from src.metrics import timed
+from src.results import Leg
+from src.snapshot import DATA_DIR
 from src.stations import Station
 
+# One row per stop: the line's code and the station, from west to east
+LINES_PATH = os.path.join(DATA_DIR, "Lines.csv")
+
 
 class Line:
     """One WMATA line."""
@@ -12,6 +20,10 @@ class Line:
         self.stations = stations
         self.transfer_stations = self.get_transfer_stations(stations)
         self.station_names = [s.name for s in stations]
+        # Position of each station along the line, west to east
+        self.station_index = {name: i for i, name in enumerate(self.station_names)}
+        # Legs already planned on this line; they are immutable, so trips share them
+        self.legs = dict()
 
     def get_transfer_stations(self, stations: list[Station]) -> dict[list[Station]]:
         """Identify transfer stations along the line."""
@@ -27,30 +39,13 @@ class Line:
 
     def contains_station(self, station: str) -> bool:
         """Returns whether a station is in this line."""
-        for s in self.stations:
-            if s.name == station:
-                return True
-        return False
-
-    def reorganize_egresses(self, egress_list: list[dict]) -> dict[list]:
-        """Reorganizes egresses."""
-        names = set()
-        reorganized_e = defaultdict(list)
-        for egress in egress_list:
-            names.add(egress["label"])
-        for egress in egress_list:
-            reorganized_e[egress["label"]].append(
-                [egress["icon"], egress["car"], egress["door"], egress["preferred"]]
-            )
-        for label, egress_list in reorganized_e.items():
-            sorted_e_list = sorted(egress_list, key=lambda x: (x[1], x[2]))
-            reorganized_e[label] = sorted_e_list
-        return reorganized_e
+        return station in self.station_index
 
     def get_transfer_stations_for_line(self, line: str) -> list[Station]:
         """Return transfer stations on the line given another line."""
         return self.transfer_stations[line]
 
+    @timed("line_plan_trip")
     def plan_trip(
         self,
         start_station: Station,
@@ -58,31 +53,47 @@ class Line:
         transfer: bool = False,
         transfer_line: str = None,
         transfer_direction: str = None,
-    ) -> dict:
+    ) -> Leg:
         """Plan a trip along this line."""
-        trip = dict()
+        key = (
+            start_station.name,
+            end_station.name,
+            transfer,
+            transfer_line,
+            transfer_direction,
+        )
+        if key in self.legs:
+            return self.legs[key]
         direction, num_stops = self.get_direction_and_number(start_station, end_station)
-        egresses = end_station.egresses
-        egress_locations = []
-        for egress in egresses:
-            egress_info = egress.get_exit_info(direction, self.name)
-            if egress_info:
-                if transfer:
-                    if egress.is_transfer(transfer_line, transfer_direction):
-                        egress_locations.append(egress_info)
-                else:
-                    egress_locations.append(egress_info)
-        egress_locations = self.reorganize_egresses(egress_locations)
+        egress_locations = end_station.egress_groups(
+            direction, self.name, transfer, transfer_line, transfer_direction
+        )
         if direction == "eastbound":
             direction = self.eastern_end
         else:
             direction = self.western_end
-        trip["num_stops"] = num_stops
-        trip["egresses"] = egress_locations
-        trip["start_station"] = start_station.name
-        trip["end_station"] = end_station.name
-        trip["lines"] = {self.name: direction}
-        return trip
+        leg = Leg(
+            start_station.name,
+            end_station.name,
+            num_stops,
+            ((self.name, direction),),
+            egress_locations,
+        )
+        self.legs[key] = leg
+        return leg
+
+    def neighbours(self, station: str, terminus: str) -> tuple[str, str]:
+        """The stations before and after one, for a train toward a terminus.
+
+        Either is None at the end of the line.
+        """
+        i = self.station_index[station]
+        names = self.station_names
+        before = names[i - 1] if i > 0 else None
+        after = names[i + 1] if i + 1 < len(names) else None
+        if terminus == self.western_end:
+            return after, before
+        return before, after
 
     @property
     def eastern_end(self) -> str:
@@ -95,8 +106,8 @@ class Line:
     def get_direction_and_number(
         self, start_station: Station, end_station: Station
     ) -> tuple:
-        start_index = self.station_names.index(start_station.name)
-        end_index = self.station_names.index(end_station.name)
+        start_index = self.station_index[start_station.name]
+        end_index = self.station_index[end_station.name]
         num_stations = abs(start_index - end_index)
         if end_index > start_index:
             return "eastbound", num_stations
@@ -104,180 +115,18 @@ class Line:
             return "westbound", num_stations
 
 
-def define_all_lines(stations: dict) -> dict[str:Line]:
-    red_stations = [
-        "Shady Grove",
-        "Rockville",
-        "Twinbrook",
-        "North Bethesda",
-        "Grosvenor-Strathmore",
-        "Medical Center",
-        "Bethesda",
-        "Friendship Heights",
-        "Tenleytown-AU",
-        "Van Ness-UDC",
-        "Cleveland Park",
-        "Woodley Park",
-        "Dupont Circle",
-        "Farragut North",
-        "Metro Center",
-        "Gallery Place",
-        "Judiciary Square",
-        "Union Station",
-        "NoMa-Gallaudet U",
-        "Rhode Island Avenue",
-        "Brookland-CUA",
-        "Fort Totten",
-        "Takoma",
-        "Silver Spring",
-        "Forest Glen",
-        "Wheaton",
-        "Glenmont",
-    ]
-    green_stations = [
-        "Greenbelt",
-        "College Park-U of Md",
-        "Hyattsville Crossing",
-        "West Hyattsville",
-        "Fort Totten",
-        "Georgia Avenue-Petworth",
-        "Columbia Heights",
-        "U Street",
-        "Shaw-Howard U",
-        "Mount Vernon Square",
-        "Gallery Place",
-        "Archives",
-        "L'Enfant Plaza",
-        "Waterfront",
-        "Navy Yard-Ballpark",
-        "Anacostia",
-        "Congress Heights",
-        "Southern Avenue",
-        "Naylor Road",
-        "Suitland",
-        "Branch Avenue",
-    ]
-    yellow_stations = [
-        "Mount Vernon Square",
-        "Gallery Place",
-        "Archives",
-        "L'Enfant Plaza",
-        "Pentagon",
-        "Pentagon City",
-        "Crystal City",
-        "Washington National Airport",
-        "Potomac Yard",
-        "Braddock Road",
-        "King Street-Old Town",
-        "Eisenhower Avenue",
-        "Huntington",
-    ]
-    blue_stations = [
-        "Franconia-Springfield",
-        "Van Dorn Street",
-        "King Street-Old Town",
-        "Braddock Road",
-        "Potomac Yard",
-        "Washington National Airport",
-        "Crystal City",
-        "Pentagon City",
-        "Pentagon",
-        "Arlington Cemetery",
-        "Rosslyn",
-        "Foggy Bottom-GWU",
-        "Farragut West",
-        "McPherson Square",
-        "Metro Center",
-        "Federal Triangle",
-        "Smithsonian",
-        "L'Enfant Plaza",
-        "Federal Center SW",
-        "Capitol South",
-        "Eastern Market",
-        "Potomac Avenue",
-        "Stadium-Armory",
-        "Benning Road",
-        "Capitol Heights",
-        "Addison Road",
-        "Morgan Boulevard",
-        "Downtown Largo",
-    ]
+def read_line_stations(path: str = LINES_PATH) -> dict[str : list[str]]:
+    """Station names of each line, in order from its western to eastern end."""
+    line_stations = dict()
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            line_stations.setdefault(row["line"], []).append(row["station"])
+    return line_stations
+
 
-    silver_stations = [
-        "Ashburn",
-        "Loudoun Gateway",
-        "Washington Dulles International Airport",
-        "Innovation Center",
-        "Herndon",
-        "Reston Town Center",
-        "Wiehle-Reston East",
-        "Spring Hill",
-        "Greensboro",
-        "Tysons",
-        "McLean",
-        "East Falls Church",
-        "Ballston-MU",
-        "Virginia Square-GMU",
-        "Clarendon",
-        "Court House",
-        "Rosslyn",
-        "Foggy Bottom-GWU",
-        "Farragut West",
-        "McPherson Square",
-        "Metro Center",
-        "Federal Triangle",
-        "Smithsonian",
-        "L'Enfant Plaza",
-        "Federal Center SW",
-        "Capitol South",
-        "Eastern Market",
-        "Potomac Avenue",
-        "Stadium-Armory",
-        "Benning Road",
-        "Capitol Heights",
-        "Addison Road",
-        "Morgan Boulevard",
-        "Downtown Largo",
-    ]
-    orange_stations = [
-        "Vienna",
-        "Dunn Loring",
-        "West Falls Church",
-        "East Falls Church",
-        "Ballston-MU",
-        "Virginia Square-GMU",
-        "Clarendon",
-        "Court House",
-        "Rosslyn",
-        "Foggy Bottom-GWU",
-        "Farragut West",
-        "McPherson Square",
-        "Metro Center",
-        "Federal Triangle",
-        "Smithsonian",
-        "L'Enfant Plaza",
-        "Federal Center SW",
-        "Capitol South",
-        "Eastern Market",
-        "Potomac Avenue",
-        "Stadium-Armory",
-        "Minnesota Avenue",
-        "Deanwood",
-        "Cheverly",
-        "Landover",
-        "New Carrollton",
-    ]
-    red = Line([stations[s] for s in red_stations], "RD")
-    green = Line([stations[s] for s in green_stations], "GR")
-    yellow = Line([stations[s] for s in yellow_stations], "YL")
-    blue = Line([stations[s] for s in blue_stations], "BL")
-    silver = Line([stations[s] for s in silver_stations], "SV")
-    orange = Line([stations[s] for s in orange_stations], "OR")
+def define_all_lines(stations: dict, path: str = LINES_PATH) -> dict[str:Line]:
+    """Build every line listed in the lines file from the loaded stations."""
     return {
-        "RD": red,
-        "GR": green,
-        "YL": yellow,
-        "BL": blue,
-        "OR": orange,
-        "SV": silver,
+        name: Line([stations[s] for s in station_names], name)
+        for name, station_names in read_line_stations(path).items()
     }
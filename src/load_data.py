@@ -1,7 +1,13 @@
-from src.egresses import get_egresses
-from src.stations import load_all_stations
-from src.lines import define_all_lines
+import os
 
-egresses = get_egresses()
-stations = load_all_stations(egresses)
-lines = define_all_lines(stations)
+from src.metrics import startup_stage
+from src.snapshot import load_network, network_version
+
+# Set WMATA_SNAPSHOT_ONLY=1 to serve from a prebuilt snapshot without pandas.
+SNAPSHOT_ONLY = os.environ.get("WMATA_SNAPSHOT_ONLY", "0") == "1"
+
+# Hash of the data and code the network was built from
+with startup_stage("network_version"):
+    version = network_version()
+with startup_stage("load_network"):
+    stations, lines = load_network(rebuild=not SNAPSHOT_ONLY, version=version)
@@ -0,0 +1,174 @@
+"""Optional timing hooks, exported in the Prometheus text format.
+
+Set WMATA_METRICS=1 to turn the hooks on. The setting is read at import time:
+when it is off, timed() returns the function unchanged, so the hooks cost
+nothing. Metrics are kept per process, so each gunicorn worker reports its own.
+"""
+
+import os
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+ENABLED = os.environ.get("WMATA_METRICS", "0") == "1"
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+)
+
+_lock = threading.Lock()
+
+
+class Histogram:
+    """Counts of observed durations per bucket, as in a Prometheus histogram."""
+
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+stage_durations = defaultdict(Histogram)
+# Cache name to [hits, misses]
+cache_lookups = defaultdict(lambda: [0, 0])
+startup_durations = dict()
+# Bytes still allocated at the end of each startup stage, when tracemalloc is on
+startup_memory = dict()
+
+
+def observe(stage: str, seconds: float):
+    """Record how long one run of a stage took."""
+    with _lock:
+        stage_durations[stage].observe(seconds)
+
+
+def record_cache(cache: str, hit: bool):
+    """Count one lookup in a cache."""
+    with _lock:
+        cache_lookups[cache][0 if hit else 1] += 1
+
+
+def reset():
+    """Forget everything recorded so far, except startup timings."""
+    with _lock:
+        stage_durations.clear()
+        cache_lookups.clear()
+
+
+def timed(stage: str):
+    """Decorator recording each call's duration under stage, if metrics are on."""
+
+    def decorate(func):
+        if not ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(stage, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorate
+
+
+@contextmanager
+def startup_stage(stage: str):
+    """Record how long a one-off startup stage took. Always on, as it runs once.
+
+    If tracemalloc is tracing, also records the memory the stage allocated
+    and kept, as the profiler in src.profile_startup does.
+    """
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        allocated = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    yield
+    startup_durations[stage] = time.perf_counter() - start
+    if tracing:
+        startup_memory[stage] = tracemalloc.get_traced_memory()[0] - allocated
+
+
+def render(caches: dict = None) -> str:
+    """All metrics in the Prometheus text exposition format.
+
+    caches maps the name of a cache kept outside this module, such as an
+    lru_cache, to its (hits, misses).
+    """
+    out = []
+    out.append(
+        "# HELP wmata_startup_duration_seconds Time taken by each startup stage."
+    )
+    out.append("# TYPE wmata_startup_duration_seconds gauge")
+    for stage, seconds in startup_durations.items():
+        out.append(f'wmata_startup_duration_seconds{{stage="{stage}"}} {seconds}')
+
+    with _lock:
+        histograms = {
+            stage: (h.buckets, list(h.counts), h.sum, h.count)
+            for stage, h in stage_durations.items()
+        }
+        caches = {
+            **{name: tuple(n) for name, n in cache_lookups.items()},
+            **(caches or {}),
+        }
+    out.append("# HELP wmata_stage_duration_seconds Time spent in each request stage.")
+    out.append("# TYPE wmata_stage_duration_seconds histogram")
+    for stage, (buckets, counts, total, count) in sorted(histograms.items()):
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, counts):
+            cumulative += bucket_count
+            out.append(
+                f'wmata_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}}'
+                f" {cumulative}"
+            )
+        out.append(
+            f'wmata_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}'
+        )
+        out.append(f'wmata_stage_duration_seconds_sum{{stage="{stage}"}} {total}')
+        out.append(f'wmata_stage_duration_seconds_count{{stage="{stage}"}} {count}')
+
+    if caches:
+        out.append("# HELP wmata_cache_requests_total Cache lookups by result.")
+        out.append("# TYPE wmata_cache_requests_total counter")
+        for cache, (hits, misses) in caches.items():
+            out.append(
+                f'wmata_cache_requests_total{{cache="{cache}",result="hit"}} {hits}'
+            )
+            out.append(
+                f'wmata_cache_requests_total{{cache="{cache}",result="miss"}} {misses}'
+            )
+        out.append(
+            "# HELP wmata_cache_hit_ratio Share of cache lookups that were hits."
+        )
+        out.append("# TYPE wmata_cache_hit_ratio gauge")
+        for cache, (hits, misses) in caches.items():
+            ratio = hits / (hits + misses) if hits + misses else 0.0
+            out.append(f'wmata_cache_hit_ratio{{cache="{cache}"}} {ratio}')
+    return "\n".join(out) + "\n"
@@ -0,0 +1,230 @@
+"""The network being served, and reloading it when the data changes.
+
+Everything built from one version of the data (stations, lines, router and
+trip table) is kept together in a Network. Reloading builds a new Network
+beside the current one and then swaps the reference in one assignment, so a
+request that already holds the old network finishes with it unchanged.
+"""
+
+import os
+import threading
+import time
+from glob import glob
+
+from src.lines import Line, define_all_lines
+from src.results import Trip
+from src.router import Router
+from src.snapshot import (
+    DATA_FILES,
+    SNAPSHOT_PATH,
+    load_network,
+    network_version,
+    source_version,
+)
+from src.search import StationIndex
+from src.stations import Station
+from src.trip_table import build_trip_table, lookup_trip, update_trip_table
+
+
+class Network:
+    """Stations, lines and planned trips built from one version of the data."""
+
+    def __init__(
+        self,
+        version: str,
+        stations: dict[str:Station],
+        lines: dict[str:Line],
+        router: Router = None,
+        trip_table=None,
+        trip_versions: dict = None,
+        base_version: str = None,
+    ):
+        self.version = version
+        self.stations = stations
+        # Sorted once for the station lists on every page
+        self.station_names = tuple(sorted(stations.keys()))
+        self.station_index = StationIndex(stations)
+        self.lines = lines
+        self.router = router
+        self.trip_table = trip_table
+        # Data version each trip was last replanned at, for trips a reload
+        # replanned; every other trip is as it was at base_version.
+        self.trip_versions = trip_versions or dict()
+        self.base_version = base_version or version
+
+    def plan(self, start: str, end: str) -> Trip:
+        """Plan one trip from the table, or live if it is not there."""
+        return lookup_trip(
+            self.trip_table, self.stations, self.lines, start, end, self.router
+        )
+
+    def trip_version(self, start: str, end: str) -> str:
+        """Version of the data the trip between two stations last changed at."""
+        if self.trip_table is None or (start, end) not in self.trip_table:
+            return self.version
+        return self.trip_versions.get((start, end), self.base_version)
+
+
+def build(
+    version: str,
+    stations: dict[str:Station],
+    lines: dict[str:Line],
+    use_router: bool = False,
+    live_planning: bool = False,
+) -> Network:
+    """Build the router and trip table for a network from scratch."""
+    router = Router(stations, lines) if use_router else None
+    trip_table = None
+    if not live_planning:
+        trip_table = build_trip_table(stations, lines, router)
+    return Network(version, stations, lines, router, trip_table)
+
+
+def same_station(old: Station, new: Station) -> bool:
+    """Whether two builds of a station have the same lines, egresses and aliases."""
+    return old is new or (
+        old.lines == new.lines
+        and old.egress_table == new.egress_table
+        and old.aliases == new.aliases
+    )
+
+
+def line_stations(lines: dict[str:Line]) -> dict[str : list[str]]:
+    """The stations of each line, in order."""
+    return {name: line.station_names for name, line in lines.items()}
+
+
+def rebuild(
+    network: Network,
+    version: str,
+    stations: dict[str:Station],
+    lines: dict[str:Line],
+) -> tuple[Network, set[str]]:
+    """Build the network for new data, reusing what the change did not touch.
+
+    Unchanged stations keep their existing objects. If only egresses changed,
+    the lines are redefined over the stations, the router keeps its shortest
+    paths, and only trips through the changed stations are replanned. If any
+    station was added, removed or changed lines, or any line changed its
+    stops, the router and trip table are rebuilt. Returns the new network and
+    the names of the changed stations.
+    """
+    changed = {
+        name
+        for name in stations.keys() | network.stations.keys()
+        if name not in stations
+        or name not in network.stations
+        or not same_station(network.stations[name], stations[name])
+    }
+    use_router = network.router is not None
+    live_planning = network.trip_table is None
+    if (
+        stations.keys() != network.stations.keys()
+        or any(stations[name].lines != network.stations[name].lines for name in changed)
+        or line_stations(lines) != line_stations(network.lines)
+    ):
+        return build(version, stations, lines, use_router, live_planning), changed
+
+    stations = {
+        name: station if name in changed else network.stations[name]
+        for name, station in stations.items()
+    }
+    lines = define_all_lines(stations)
+    router = network.router.with_network(stations, lines) if use_router else None
+    if live_planning:
+        return Network(version, stations, lines, router), changed
+    trip_table, replanned = update_trip_table(
+        network.trip_table, stations, lines, changed, router
+    )
+    trip_versions = dict(network.trip_versions)
+    trip_versions.update(dict.fromkeys(replanned, version))
+    return (
+        Network(
+            version,
+            stations,
+            lines,
+            router,
+            trip_table,
+            trip_versions,
+            network.base_version,
+        ),
+        changed,
+    )
+
+
+class NetworkReloader:
+    """Holds the current network and replaces it when the data files change.
+
+    check() is cheap enough to call on every request: it looks at the data
+    files' modification times at most once every interval seconds, and only
+    hashes them when one has changed. One thread reloads at a time while the
+    others keep serving the current network.
+    """
+
+    def __init__(
+        self,
+        network: Network,
+        interval: float,
+        snapshot_only: bool = False,
+        path: str = SNAPSHOT_PATH,
+    ):
+        self.network = network
+        self.interval = interval
+        self.snapshot_only = snapshot_only
+        self.path = path
+        self.source_version = source_version()
+        self.mtimes = self.data_mtimes()
+        self.next_check = time.monotonic() + interval
+        self.lock = threading.Lock()
+
+    def data_mtimes(self) -> dict[str:float]:
+        """Modification time of each data file, and of the snapshot if used."""
+        paths = glob(DATA_FILES)
+        if self.snapshot_only:
+            paths.append(self.path)
+        mtimes = dict()
+        for path in paths:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+        return mtimes
+
+    def check(self) -> set[str]:
+        """Reload if the data files changed; returns the changed stations, if any."""
+        if self.interval <= 0 or time.monotonic() < self.next_check:
+            return None
+        if not self.lock.acquire(blocking=False):
+            return None
+        try:
+            self.next_check = time.monotonic() + self.interval
+            mtimes = self.data_mtimes()
+            if mtimes == self.mtimes:
+                return None
+            self.mtimes = mtimes
+            return self.reload()
+        finally:
+            self.lock.release()
+
+    def reload(self) -> set[str]:
+        """Load the network for the data on disk and swap it in if it changed.
+
+        Returns the names of the changed stations, or None if nothing changed.
+        Raises RuntimeError if the code in src/ changed since startup, as that
+        needs a restart, or if serving from a snapshot that is out of date.
+        """
+        if source_version() != self.source_version:
+            raise RuntimeError("src/ changed since startup, restart to reload")
+        version = network_version()
+        if version == self.network.version:
+            return None
+        # Building from the CSVs reuses the stations whose rows did not change
+        stations, lines = load_network(
+            self.path,
+            rebuild=not self.snapshot_only,
+            version=version,
+            previous=self.network.stations,
+        )
+        network, changed = rebuild(self.network, version, stations, lines)
+        self.network = network
+        return changed
@@ -0,0 +1,45 @@
+"""A small least-recently-used cache of rendered pages."""
+
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+
+
+class PageCache:
+    """Rendered pages by key, dropping the least recently used beyond maxsize.
+
+    Only the rendered strings are kept, so a cached page holds no reference
+    to the network it was rendered from.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.pages = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple, render: Callable[[], str]) -> str:
+        """The page for key, calling render to make it if it is not cached."""
+        with self.lock:
+            page = self.pages.get(key)
+            if page is not None:
+                self.pages.move_to_end(key)
+                self.hits += 1
+                return page
+            self.misses += 1
+        # Render outside the lock, so other requests are not held up
+        page = render()
+        if self.maxsize > 0:
+            with self.lock:
+                self.pages[key] = page
+                self.pages.move_to_end(key)
+                while len(self.pages) > self.maxsize:
+                    self.pages.popitem(last=False)
+        return page
+
+    def clear(self):
+        with self.lock:
+            self.pages.clear()
+            self.hits = 0
+            self.misses = 0
@@ -0,0 +1,220 @@
+"""Plan the trip for every row of an origin-destination (OD) matrix.
+
+    python -m src.plan_od od.csv --out od_trips.csv [--workers N] [--router]
+
+Reads rows with start_station and end_station columns from a CSV or, if
+pyarrow is installed, a Parquet file, and writes each row back out with two
+more columns: trip, the planned trip as JSON in the form of the API, and
+error, for pairs that could not be planned. Whichever of the two does not
+apply is empty in CSV and null in JSON lines and Parquet. Output is CSV, JSON lines
+(.jsonl) or Parquet, chosen by the file extension; "-" reads or writes CSV
+on stdin or stdout.
+
+Rows are read and written in batches, in input order, so memory stays
+bounded however long the file is. Each distinct pair is planned only once,
+across a pool of processes that share the network loaded here, and repeats
+reuse the result.
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+from src.plan_trip import TripPlanner
+from src.router import Router
+from src.snapshot import load_network
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+BATCH_SIZE = 50000
+
+# Set before the pool starts, so forked workers share them without copying
+stations = None
+lines = None
+router = None
+
+
+def init_worker(use_router: bool):
+    """Load the network in a worker that did not inherit it."""
+    global stations, lines, router
+    if stations is None:
+        stations, lines = load_network()
+        router = Router(stations, lines) if use_router else None
+
+
+def plan_pair(pair: tuple[str, str]) -> tuple[str, str]:
+    """The trip between two stations as JSON, and the error if it failed."""
+    try:
+        trip = TripPlanner(stations, lines, *pair, router).plan_trip()
+    except Exception as e:
+        return "", f"Could not plan trip: {e}"
+    return json.dumps(trip.to_dict(), separators=(",", ":")), ""
+
+
+def read_batches(path: str, batch_size: int) -> Iterator[list[dict]]:
+    """Rows of a CSV or Parquet file, as lists of dicts of batch_size rows."""
+    if path.endswith(".parquet"):
+        if pyarrow is None:
+            raise SystemExit("Reading Parquet needs pyarrow: pip install pyarrow")
+        for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size):
+            yield batch.to_pylist()
+        return
+    f = sys.stdin if path == "-" else open(path, newline="")
+    try:
+        batch = []
+        for row in csv.DictReader(f):
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+class RowWriter:
+    """Writes batches of rows to a CSV, JSON lines or Parquet file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.format = "csv"
+        if path.endswith((".jsonl", ".ndjson")):
+            self.format = "jsonl"
+        elif path.endswith(".parquet"):
+            if pyarrow is None:
+                raise SystemExit("Writing Parquet needs pyarrow: pip install pyarrow")
+            self.format = "parquet"
+        self.file = None
+        self.writer = None
+
+    def write(self, rows: list[dict]):
+        if self.format == "parquet":
+            # Nulls rather than empty strings, typed so every batch casts alike
+            rows = [
+                {**row, "trip": row["trip"] or None, "error": row["error"] or None}
+                for row in rows
+            ]
+            table = pyarrow.Table.from_pylist(rows)
+            if self.writer is None:
+                schema = table.schema
+                for name in ("trip", "error"):
+                    schema = schema.set(
+                        schema.get_field_index(name),
+                        pyarrow.field(name, pyarrow.string()),
+                    )
+                self.writer = pyarrow.parquet.ParquetWriter(self.path, schema)
+            self.writer.write_table(table.cast(self.writer.schema))
+            return
+        if self.file is None:
+            if self.path == "-":
+                self.file = sys.stdout
+            else:
+                self.file = open(self.path, "w", newline="")
+        if self.format == "jsonl":
+            for row in rows:
+                # The trip is already JSON, so splice it in as an object
+                fields = {k: v for k, v in row.items() if k != "trip"}
+                fields["error"] = row["error"] or None
+                trip = row["trip"] or "null"
+                self.file.write(f'{json.dumps(fields)[:-1]}, "trip": {trip}}}\n')
+            return
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.file, fieldnames=list(rows[0]))
+            self.writer.writeheader()
+        self.writer.writerows(rows)
+
+    def close(self):
+        if self.format == "parquet":
+            if self.writer is not None:
+                self.writer.close()
+        elif self.file is not None and self.file is not sys.stdout:
+            self.file.close()
+
+
+def plan_od(
+    source: str,
+    out: str,
+    workers: int = None,
+    use_router: bool = False,
+    batch_size: int = BATCH_SIZE,
+    start_column: str = "start_station",
+    end_column: str = "end_station",
+) -> tuple[int, int]:
+    """Plan every row of source into out; returns (rows, distinct pairs planned)."""
+    global stations, lines, router
+    workers = workers or os.cpu_count()
+    stations, lines = load_network()
+    router = Router(stations, lines) if use_router else None
+    # Fork where possible, so workers start with the network already loaded
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+
+    # Pair to (trip, error); only known stations, so bounded by the network
+    planned = dict()
+    writer = RowWriter(out)
+    rows_written = 0
+    with ProcessPoolExecutor(
+        workers, mp_context=context, initializer=init_worker, initargs=(use_router,)
+    ) as executor:
+        for batch in read_batches(source, batch_size):
+            pairs = [(row[start_column], row[end_column]) for row in batch]
+            new_pairs = list(
+                {
+                    pair: None
+                    for pair in pairs
+                    if pair not in planned
+                    and pair[0] in stations
+                    and pair[1] in stations
+                }
+            )
+            chunksize = max(1, len(new_pairs) // (4 * workers))
+            for pair, result in zip(
+                new_pairs, executor.map(plan_pair, new_pairs, chunksize=chunksize)
+            ):
+                planned[pair] = result
+            for row, pair in zip(batch, pairs):
+                result = planned.get(pair)
+                if result is None:
+                    unknown = pair[0] if pair[0] not in stations else pair[1]
+                    result = ("", f"Unknown station: {unknown}")
+                row["trip"], row["error"] = result
+            writer.write(batch)
+            rows_written += len(batch)
+    writer.close()
+    return rows_written, len(planned)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", help="CSV or Parquet file of OD rows, or -")
+    parser.add_argument("--out", default="-", help="CSV, .jsonl or .parquet, or -")
+    parser.add_argument("--workers", type=int, help="processes (default: all CPUs)")
+    parser.add_argument(
+        "--router", action="store_true", help="plan transfers with the graph router"
+    )
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--start-column", default="start_station")
+    parser.add_argument("--end-column", default="end_station")
+    args = parser.parse_args()
+
+    rows, pairs = plan_od(
+        args.source,
+        args.out,
+        args.workers,
+        args.router,
+        args.batch_size,
+        args.start_column,
+        args.end_column,
+    )
+    print(f"Planned {pairs} distinct pairs for {rows} rows", file=sys.stderr)
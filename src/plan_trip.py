@@ -1,8 +1,9 @@
 """Plan a trip."""
 
-import pandas as pd
 from collections import defaultdict
-import copy
+from dataclasses import replace
+from src.metrics import timed
+from src.results import EgressGroup, Leg, Trip
 from src.stations import Station
 from src.lines import Line
 
@@ -14,31 +15,29 @@ class TripPlanner:
         lines: dict[str:Line],
         start_station: str,
         end_station: str,
+        router=None,
     ):
         self.stations = stations
         self.lines = lines
         self.start_station = stations[start_station]
         self.end_station = stations[end_station]
+        # Optional src.router.Router used for trips that need a transfer
+        self.router = router
 
-    def plan_trip(self) -> dict:
+    @timed("plan_trip")
+    def plan_trip(self) -> Trip:
         """Plan a trip."""
         start_lines = self.start_station.lines
         end_lines = self.end_station.lines
         union_lines = start_lines.intersection(end_lines)
-        trip_info = dict()
         if union_lines:
-            trip = self.plan_single_line_trip(union_lines)
-            trip_info["first_leg"] = trip
-            trip_info["transfer"] = False
-            return trip_info
+            return Trip((self.plan_single_line_trip(union_lines),))
+        elif self.router is not None:
+            return self.router.plan_trip(self.start_station.name, self.end_station.name)
         else:
-            trip = self.plan_two_line_trip(start_lines, end_lines)
-            trip_info["first_leg"] = trip[0]
-            trip_info["second_leg"] = trip[1]
-            trip_info["transfer"] = True
-            return trip_info
+            return Trip(self.plan_two_line_trip(start_lines, end_lines))
 
-    def plan_two_line_trip(self, start_lines, end_lines):
+    def plan_two_line_trip(self, start_lines, end_lines) -> tuple[Leg, Leg]:
         possible_trips = defaultdict(list)
         transfer_plans = self.get_transfer_plans(start_lines, end_lines)
         for t_plan in transfer_plans:
@@ -50,51 +49,66 @@ class TripPlanner:
                 t_plan["transfer_station"],
                 transfer=True,
                 transfer_line=t_plan["end_line"],
-                transfer_direction=list(second_leg["lines"].values())[0],
+                transfer_direction=second_leg.direction,
             )
-            possible_trips[second_leg["num_stops"] + first_leg["num_stops"]].append(
+            possible_trips[second_leg.num_stops + first_leg.num_stops].append(
                 (first_leg, second_leg)
             )
         possible_trips = possible_trips[min(possible_trips)]
-        trip = self.combine_trips(possible_trips)
-        if not trip[0]["egresses"]:
+        first_leg, second_leg = self.combine_trips(possible_trips)
+        if not first_leg.egresses:
             if not self.check_directions(
-                list(trip[0]["lines"].values())[0], list(trip[1]["lines"].values())[0]
+                self.lines,
+                first_leg.end_station,
+                *first_leg.lines[0],
+                *second_leg.lines[0],
             ):
-                new_egresses = dict()
-                for label, egresses in trip[1]["egresses"].items():
-                    new_egresses[label] = []
-                    for e in egresses:
-                        new_egresses[label].append([e[0], 9 - e[1], 4 - e[2]])
-                trip[0]["egresses"] = new_egresses
-        return trip
+                first_leg = replace(
+                    first_leg, egresses=self.same_platform_egresses(second_leg)
+                )
+        return first_leg, second_leg
+
+    @staticmethod
+    def same_platform_egresses(next_leg: Leg) -> tuple[EgressGroup]:
+        """Where to board to end up at the next leg's exits across the platform."""
+        return tuple(
+            EgressGroup(
+                group.label,
+                tuple((e[0], 9 - e[1], 4 - e[2]) for e in group.entries),
+            )
+            for group in next_leg.egresses
+        )
 
-    def check_directions(self, direction_1: str, direction_2: str) -> bool:
-        """Check the directions of two lines."""
-        one_direction = {
-            "Downtown Largo",
-            "New Carrolton",
-            "Mount Vernon Square",
-            "Greenbelt",
-        }
-        other_direction = {
-            "Franconia-Springfield",
-            "Ashburn",
-            "Vienna",
-            "Huntington",
-            "Branch Avenue",
-        }
-        if direction_1 in one_direction and direction_2 in one_direction:
-            return True
-        if direction_1 in other_direction and direction_2 in other_direction:
-            return True
-        return False
+    @staticmethod
+    def check_directions(
+        lines: dict[str:Line],
+        station: str,
+        line_1: str,
+        direction_1: str,
+        line_2: str,
+        direction_2: str,
+    ) -> bool:
+        """Check that a transfer does not double back along shared track.
+
+        Trains on track both lines share, running opposite ways, stop on either
+        side of the platform. Anywhere else the directions are taken to agree.
+        """
+        before_1, after_1 = lines[line_1].neighbours(station, direction_1)
+        before_2, after_2 = lines[line_2].neighbours(station, direction_2)
+        if before_1 is not None and before_1 == after_2:
+            return False
+        if after_1 is not None and after_1 == before_2:
+            return False
+        return True
 
+    @timed("get_transfer_plans")
     def get_transfer_plans(self, start_lines: str, end_lines: str) -> list[dict]:
         """Get transfer plans."""
         transfer_plans = []
-        for s_line in start_lines:
-            for e_line in end_lines:
+        # Sorted, so ties between equally short trips break the same way
+        # whatever order the sets iterate in
+        for s_line in sorted(start_lines):
+            for e_line in sorted(end_lines):
                 transfer_stations = self.lines[s_line].get_transfer_stations_for_line(
                     e_line
                 )
@@ -106,46 +120,46 @@ class TripPlanner:
                     transfer_plans.append(transfer_plan)
         return transfer_plans
 
-    def combine_trips(self, trips: list[dict]) -> list[dict]:
+    @timed("combine_trips")
+    def combine_trips(self, trips: list[tuple[Leg, Leg]]) -> tuple[Leg, Leg]:
         """Deal with many potential trips."""
         first_lines = dict()
         second_lines = dict()
         for trip in trips:
-            first_lines.update(trip[0]["lines"])
-            second_lines.update(trip[1]["lines"])
+            first_lines.update(trip[0].lines)
+            second_lines.update(trip[1].lines)
         first_leg = trips[0][0]
         second_leg = trips[0][1]
         if (len(first_lines) > 1) and ("RD" in first_lines.keys()):
             first_lines.pop("RD")
         if (len(second_lines) > 1) and ("RD" in second_lines.keys()):
             second_lines.pop("RD")
-        first_leg["lines"] = first_lines
-        second_leg["lines"] = second_lines
-
-        return [first_leg, second_leg]
+        return (
+            replace(first_leg, lines=tuple(first_lines.items())),
+            replace(second_leg, lines=tuple(second_lines.items())),
+        )
 
-    def plan_single_line_trip(self, union_lines: set[str]) -> dict:
+    def plan_single_line_trip(self, union_lines: set[str]) -> Leg:
         """Plan a trip along one line."""
         trips = {}
         len_dict = defaultdict(list)
-        for line in union_lines:
+        for line in sorted(union_lines):
             trip = self.lines[line].plan_trip(self.start_station, self.end_station)
             trips[line] = trip
-            len_dict[trip["num_stops"]].append(line)
+            len_dict[trip.num_stops].append(line)
         if len(trips) == 1:
             return list(trips.values())[0]
         if union_lines == {"RD", "GR"}:
             return trips["RD"]
         if len(len_dict) == 1:
             main_trip = list(trips.values())[0]
-            trip_line_dict = main_trip["lines"]
+            trip_line_dict = dict(main_trip.lines)
             for trip in list(trips.values()):
-                trip_line_dict.update(trip["lines"])
-            return main_trip
+                trip_line_dict.update(trip.lines)
         else:
             smallest_dist = min(len_dict)
             main_trip = trips[len_dict[smallest_dist][0]]
-            trip_line_dict = main_trip["lines"]
-            for trip in trips[len_dict[smallest_dist]]:
-                trip_line_dict.update(trip["lines"])
-            return main_trip
+            trip_line_dict = dict(main_trip.lines)
+            for line in len_dict[smallest_dist]:
+                trip_line_dict.update(trips[line].lines)
+        return replace(main_trip, lines=tuple(trip_line_dict.items()))
@@ -0,0 +1,199 @@
+"""Render every trip page ahead of time, as a static site.
+
+    python -m src.prerender [--out build/site] [--workers N] [--router] [--force]
+
+For each pair of stations this writes the trip page and its JSON twin (the
+same result as /api/trips) under fingerprinted names, for caching forever,
+and under stable names, trips/<start>--<end>.html and .json with each station
+name slugged, which the pages' form navigates to. Each file has a .gz copy
+and, if the brotli package is installed, a .br copy. manifest.json maps each
+pair to its files, and also records a key for each pair's inputs: its trip,
+the station list, the template and the planning engine. Pairs whose key is
+unchanged since the last run, and whose files are still there, are not
+rendered again.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from flask import Flask, render_template
+
+from src.batch import plan_pairs
+from src.fragments import line_markup, station_options
+from src.results import Trip
+from src.router import Router
+from src.snapshot import load_network, network_version
+from src.trip_table import build_trip_table, lookup_trip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SITE_PATH = "build/site"
+
+# Only used to render templates, with the same folders as the app
+site = Flask("app", root_path=ROOT)
+site.add_template_global(station_options)
+site.add_template_global(line_markup)
+
+
+def slug(name: str) -> str:
+    """File name safe version of a station name."""
+    return re.sub(r"[^A-Za-z0-9]+", "-", name).strip("-").lower()
+
+
+def pair_path(start: str, end: str) -> str:
+    """Path of a pair's files, before the extension; the pages' form uses it."""
+    return f"trips/{slug(start)}--{slug(end)}"
+
+
+def fingerprint(data: bytes) -> str:
+    """Short content hash for file names."""
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def write_file(out: str, name: str, data: bytes) -> list[str]:
+    """Write a file and its compressed copies; returns the paths written."""
+    paths = [name, f"{name}.gz"]
+    with open(os.path.join(out, name), "wb") as f:
+        f.write(data)
+    with open(os.path.join(out, f"{name}.gz"), "wb") as f:
+        # mtime=0 so the same page always compresses to the same bytes
+        f.write(gzip.compress(data, 9, mtime=0))
+    if brotli is not None:
+        paths.append(f"{name}.br")
+        with open(os.path.join(out, f"{name}.br"), "wb") as f:
+            f.write(brotli.compress(data))
+    return paths
+
+
+def render(trip_info: Trip, station_names: tuple[str]) -> bytes:
+    """Render index.html as the app does, for a trip or for no trip."""
+    with site.test_request_context("/"):
+        page = render_template(
+            "index.html",
+            stations=station_names,
+            trip_info=trip_info,
+            static_site=True,
+        )
+    return page.encode()
+
+
+def render_pair(job: tuple, out: str, station_names: tuple[str]) -> dict:
+    """Write the page and JSON twin of one pair; returns its manifest entry."""
+    key, result = job
+    start, end = result["start_station"], result["end_station"]
+    entry = {"key": key, "files": []}
+    stem = pair_path(start, end)
+    data = json.dumps(result, separators=(",", ":")).encode()
+    entry["json"] = f"{stem}.{fingerprint(data)}.json"
+    entry["files"] += write_file(out, entry["json"], data)
+    entry["files"] += write_file(out, f"{stem}.json", data)
+    if "trip" in result:
+        data = render(Trip.from_dict(result["trip"]), station_names)
+        entry["html"] = f"{stem}.{fingerprint(data)}.html"
+        entry["files"] += write_file(out, entry["html"], data)
+        entry["files"] += write_file(out, f"{stem}.html", data)
+    return entry
+
+
+def load_manifest(out: str) -> dict:
+    try:
+        with open(os.path.join(out, "manifest.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"pairs": {}}
+
+
+def prerender(
+    out: str = SITE_PATH, workers: int = None, use_router: bool = False, force=False
+) -> tuple[int, int]:
+    """Render every changed pair into out; returns (rendered, skipped)."""
+    version = network_version()
+    stations, lines = load_network(version=version)
+    router = Router(stations, lines) if use_router else None
+    table = build_trip_table(stations, lines, router)
+    station_names = tuple(sorted(stations.keys()))
+    if len({slug(name) for name in station_names}) < len(station_names):
+        raise ValueError("Two stations have the same slug, so their pages would clash")
+
+    def plan(start: str, end: str) -> Trip:
+        return lookup_trip(table, stations, lines, start, end, router)
+
+    with open(os.path.join(ROOT, "templates", "index.html"), "rb") as f:
+        template = f.read()
+    # Everything a page depends on besides its own trip
+    page_inputs = hashlib.sha256(
+        json.dumps([station_names, use_router]).encode() + template
+    ).hexdigest()
+
+    os.makedirs(os.path.join(out, "trips"), exist_ok=True)
+    old_pairs = load_manifest(out)["pairs"]
+    pairs = {}
+    jobs = []
+    all_pairs = [(start, end) for start in station_names for end in station_names]
+    for result in plan_pairs(all_pairs, stations, plan):
+        pair = f"{result['start_station']}|{result['end_station']}"
+        key = hashlib.sha256(
+            (page_inputs + json.dumps(result, sort_keys=True)).encode()
+        ).hexdigest()
+        old = old_pairs.get(pair)
+        if (
+            not force
+            and old is not None
+            and old["key"] == key
+            and all(os.path.exists(os.path.join(out, p)) for p in old["files"])
+        ):
+            pairs[pair] = old
+        else:
+            jobs.append((pair, (key, result)))
+
+    render_job = partial(render_pair, out=out, station_names=station_names)
+    with ProcessPoolExecutor(workers) as executor:
+        entries = executor.map(render_job, [job for _, job in jobs], chunksize=64)
+        for (pair, _), entry in zip(jobs, entries):
+            pairs[pair] = entry
+
+    # The page with no trip, and the assets pages link to
+    write_file(out, "index.html", render(None, station_names))
+    shutil.copytree(
+        os.path.join(ROOT, "static"), os.path.join(out, "static"), dirs_exist_ok=True
+    )
+    # Remove files of pages that were rendered again or no longer exist
+    kept = {p for entry in pairs.values() for p in entry["files"]}
+    for entry in old_pairs.values():
+        for p in entry["files"]:
+            if p not in kept and os.path.exists(os.path.join(out, p)):
+                os.remove(os.path.join(out, p))
+
+    tmp_path = os.path.join(out, f"manifest.json.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"version": version, "router": use_router, "pairs": pairs}, f)
+    os.replace(tmp_path, os.path.join(out, "manifest.json"))
+    return len(jobs), len(pairs) - len(jobs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default=SITE_PATH, help="output directory")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="processes (default: all CPUs)"
+    )
+    parser.add_argument(
+        "--router", action="store_true", help="plan transfers with the graph router"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="render every pair, changed or not"
+    )
+    args = parser.parse_args()
+    rendered, skipped = prerender(args.out, args.workers, args.router, args.force)
+    print(f"Rendered {rendered} pairs, {skipped} unchanged, into {args.out}")
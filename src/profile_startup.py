@@ -0,0 +1,88 @@
+"""Profile building the network from the CSVs, stage by stage.
+
+    python -m src.profile_startup [--no-memory] [--cprofile build/startup.prof]
+
+Builds the network as a stale snapshot would, in this fresh process, and
+prints the wall time of each stage recorded with metrics.startup_stage:
+importing pandas and numpy, reading each CSV, the parts of get_egresses,
+load_all_stations and define_all_lines. With memory tracing on (the default)
+it also prints the memory each stage allocated and kept, though tracing
+slows every stage down; pass --no-memory for accurate times.
+
+--cprofile writes cProfile stats for the whole build. Open them with
+snakeviz, or turn them into a flame graph with flameprof.
+"""
+
+import argparse
+import cProfile
+import time
+import tracemalloc
+
+from src import metrics
+from src.metrics import startup_stage
+from src.snapshot import build_network
+
+
+def stage_order(stages: list[str]) -> list[str]:
+    """Stages in the order they finished, each followed by its own stages.
+
+    A stage named "parent.child" ran inside "parent".
+    """
+    ordered = []
+
+    def add(stage: str):
+        ordered.append(stage)
+        for child in stages:
+            if child.rpartition(".")[0] == stage:
+                add(child)
+
+    for stage in stages:
+        if stage.rpartition(".")[0] not in stages:
+            add(stage)
+    return ordered
+
+
+def report(total: float, peak: int = None):
+    """Print the recorded stages as a table."""
+    memory = bool(metrics.startup_memory)
+    print(f"{'stage':40} {'ms':>9} {'%':>6}" + (f" {'MB kept':>9}" if memory else ""))
+    stages = list(metrics.startup_durations)
+    for stage in stage_order(stages):
+        seconds = metrics.startup_durations[stage]
+        name = "  " * stage.count(".") + stage.rpartition(".")[2]
+        line = f"{name:40} {seconds * 1000:>9.1f} {seconds / total:>6.1%}"
+        if memory:
+            line += f" {metrics.startup_memory.get(stage, 0) / 1e6:>9.2f}"
+        print(line)
+    print(f"{'total':40} {total * 1000:>9.1f}")
+    if peak is not None:
+        print(f"Peak traced memory: {peak / 1e6:.1f}MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--no-memory", action="store_true", help="skip tracing memory allocations"
+    )
+    parser.add_argument("--cprofile", help="write cProfile stats to this file")
+    args = parser.parse_args()
+
+    if not args.no_memory:
+        tracemalloc.start()
+    profiler = cProfile.Profile() if args.cprofile else None
+    if profiler is not None:
+        profiler.enable()
+    start = time.perf_counter()
+    with startup_stage("import_pandas"):
+        import numpy
+        import pandas
+    build_network()
+    total = time.perf_counter() - start
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.cprofile)
+    peak = None if args.no_memory else tracemalloc.get_traced_memory()[1]
+
+    report(total, peak)
+    if profiler is not None:
+        print(f"Wrote {args.cprofile}")
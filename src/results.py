@@ -0,0 +1,110 @@
+"""Planned trips as immutable values.
+
+Planning builds each leg once and never changes it afterwards, so the same
+Leg can be shared by every trip that uses it, and trips can be cached and
+handed to any number of requests without copying. to_dict gives the JSON
+form used by the API and the shared trip table, and from_dict reads it back.
+"""
+
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class EgressGroup:
+    """Where to board for the egresses with one label.
+
+    Each entry is (icon, car, door, preferred), sorted by car and door.
+    Entries copied across a same-platform transfer have no preferred flag.
+    """
+
+    label: str
+    entries: tuple[tuple, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class Leg:
+    """One ride between two stations, on one or more parallel lines."""
+
+    start_station: str
+    end_station: str
+    num_stops: int
+    # (line code, terminus the train is heading to) pairs, main line first
+    lines: tuple[tuple[str, str], ...]
+    egresses: tuple[EgressGroup, ...]
+
+    @property
+    def direction(self) -> str:
+        """Terminus of the leg's main line."""
+        return self.lines[0][1]
+
+    def terminus(self, line: str) -> str:
+        """Terminus the leg heads to on one of its lines."""
+        return dict(self.lines)[line]
+
+    def to_dict(self) -> dict:
+        return {
+            "num_stops": self.num_stops,
+            "egresses": {
+                group.label: [list(entry) for entry in group.entries]
+                for group in self.egresses
+            },
+            "start_station": self.start_station,
+            "end_station": self.end_station,
+            "lines": dict(self.lines),
+        }
+
+    @classmethod
+    def from_dict(cls, leg: dict) -> "Leg":
+        return cls(
+            leg["start_station"],
+            leg["end_station"],
+            leg["num_stops"],
+            tuple(leg["lines"].items()),
+            tuple(
+                EgressGroup(label, tuple(tuple(entry) for entry in entries))
+                for label, entries in leg["egresses"].items()
+            ),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Trip:
+    """A planned trip: one leg, or one leg per train with transfers between."""
+
+    legs: tuple[Leg, ...]
+
+    @property
+    def start_station(self) -> str:
+        return self.legs[0].start_station
+
+    @property
+    def end_station(self) -> str:
+        return self.legs[-1].end_station
+
+    @property
+    def transfer(self) -> bool:
+        return len(self.legs) > 1
+
+    @property
+    def first_leg(self) -> Leg:
+        return self.legs[0]
+
+    @property
+    def second_leg(self) -> Leg:
+        """The last leg of a trip with transfers, or None without one."""
+        return self.legs[-1] if self.transfer else None
+
+    def to_dict(self) -> dict:
+        trip = {"first_leg": self.first_leg.to_dict(), "transfer": self.transfer}
+        if self.transfer:
+            legs = [leg.to_dict() for leg in self.legs]
+            trip["second_leg"] = legs[-1]
+            trip["legs"] = legs
+        return trip
+
+    @classmethod
+    def from_dict(cls, trip: dict) -> "Trip":
+        legs = trip.get("legs") or [
+            trip[leg] for leg in ("first_leg", "second_leg") if leg in trip
+        ]
+        return cls(tuple(Leg.from_dict(leg) for leg in legs))
@@ -0,0 +1,193 @@
+"""Route trips over the graph of stations and lines."""
+
+import copy
+import heapq
+from collections import defaultdict
+from dataclasses import replace
+from src.results import Trip
+from src.stations import Station
+from src.lines import Line
+from src.metrics import timed
+from src.plan_trip import TripPlanner
+
+# Cost of changing trains, in stops. Large enough that a trip with fewer
+# transfers always wins, as it does in TripPlanner.
+TRANSFER_PENALTY = 1000
+
+
+class Router:
+    """Plans trips with any number of transfers from precomputed shortest paths.
+
+    Each node of the graph is a station on one line. Neighbouring stations on a
+    line are one stop apart, and changing to another line at one of the line's
+    transfer stations costs TRANSFER_PENALTY. Between routes of equal cost, the
+    one that transfers earliest wins.
+    """
+
+    def __init__(
+        self,
+        stations: dict[str:Station],
+        lines: dict[str:Line],
+        transfer_penalty: int = TRANSFER_PENALTY,
+    ):
+        self.stations = stations
+        self.lines = lines
+        self.transfer_penalty = transfer_penalty
+        self.nodes = []
+        self.node_index = dict()
+        self.nodes_at_station = defaultdict(list)
+        for line_name in sorted(lines):
+            for station_name in lines[line_name].station_names:
+                self.node_index[(station_name, line_name)] = len(self.nodes)
+                self.nodes_at_station[station_name].append(len(self.nodes))
+                self.nodes.append((station_name, line_name))
+        self.edges = self.get_edges()
+        self.distances = []
+        self.previous = []
+        for source in range(len(self.nodes)):
+            distances, previous = self.shortest_paths(source)
+            self.distances.append(distances)
+            self.previous.append(previous)
+
+    def with_network(
+        self, stations: dict[str:Station], lines: dict[str:Line]
+    ) -> "Router":
+        """This router's shortest paths, planning legs on new stations and lines.
+
+        Only for lines with the same stops, at stations with the same lines,
+        as the paths were computed for.
+        """
+        router = copy.copy(self)
+        router.stations = stations
+        router.lines = lines
+        return router
+
+    def get_edges(self) -> list[list[tuple]]:
+        """Connect neighbouring stations on each line, and each line's transfers."""
+        edges = [[] for _ in self.nodes]
+        for line_name, line in self.lines.items():
+            names = line.station_names
+            for a, b in zip(names, names[1:]):
+                i = self.node_index[(a, line_name)]
+                j = self.node_index[(b, line_name)]
+                edges[i].append((j, 1))
+                edges[j].append((i, 1))
+            for other_line, transfer_stations in line.transfer_stations.items():
+                for station in transfer_stations:
+                    if (station.name, other_line) in self.node_index:
+                        i = self.node_index[(station.name, line_name)]
+                        j = self.node_index[(station.name, other_line)]
+                        edges[i].append((j, self.transfer_penalty))
+        return edges
+
+    def shortest_paths(self, source: int) -> tuple[list, list]:
+        """Dijkstra's algorithm from one node to every other node.
+
+        Distances are (cost, tiebreak) pairs. The tiebreak subtracts the number
+        of transfers made before each stop, so earlier transfers are preferred.
+        """
+        distances = [None] * len(self.nodes)
+        previous = [None] * len(self.nodes)
+        distances[source] = (0, 0)
+        queue = [((0, 0), source)]
+        while queue:
+            distance, node = heapq.heappop(queue)
+            if distance > distances[node]:
+                continue
+            cost, tiebreak = distance
+            for neighbour, weight in self.edges[node]:
+                if weight == self.transfer_penalty:
+                    new_distance = (cost + weight, tiebreak)
+                else:
+                    transfers = cost // self.transfer_penalty
+                    new_distance = (cost + weight, tiebreak - transfers)
+                if distances[neighbour] is None or new_distance < distances[neighbour]:
+                    distances[neighbour] = new_distance
+                    previous[neighbour] = node
+                    heapq.heappush(queue, (new_distance, neighbour))
+        return distances, previous
+
+    def get_route(self, start_station: str, end_station: str) -> list[tuple]:
+        """Return the legs of the best route as (line, board, alight) tuples."""
+        best = None
+        for source in self.nodes_at_station[start_station]:
+            for target in self.nodes_at_station[end_station]:
+                distance = self.distances[source][target]
+                if distance is not None and (best is None or distance < best[0]):
+                    best = (distance, source, target)
+        if best is None:
+            raise ValueError(f"No route from {start_station} to {end_station}")
+        _, source, target = best
+        path = [target]
+        while path[-1] != source:
+            path.append(self.previous[source][path[-1]])
+        legs = []
+        for node in reversed(path):
+            station_name, line_name = self.nodes[node]
+            if legs and legs[-1][0] == line_name:
+                legs[-1][2] = station_name
+            else:
+                legs.append([line_name, station_name, station_name])
+        return [tuple(leg) for leg in legs]
+
+    def get_stops(self, line: Line, board: str, alight: str) -> list[str]:
+        """Station names visited between two stations of a line, in travel order."""
+        start = line.station_index[board]
+        end = line.station_index[alight]
+        if end >= start:
+            return line.station_names[start : end + 1]
+        return line.station_names[end : start + 1][::-1]
+
+    def get_parallel_lines(self, line_name: str, board: str, alight: str) -> dict:
+        """Lines running through the same stations as a leg, with their terminus."""
+        stops = self.get_stops(self.lines[line_name], board, alight)
+        parallel = dict()
+        for other_name, other in self.lines.items():
+            if not (other.contains_station(board) and other.contains_station(alight)):
+                continue
+            if self.get_stops(other, board, alight) != stops:
+                continue
+            if other.station_index[alight] > other.station_index[board]:
+                parallel[other_name] = other.eastern_end
+            else:
+                parallel[other_name] = other.western_end
+        return parallel
+
+    @timed("router_plan_trip")
+    def plan_trip(self, start_station: str, end_station: str) -> Trip:
+        """Plan a trip, with each leg planned by Line.plan_trip."""
+        route = self.get_route(start_station, end_station)
+        legs = []
+        next_line = None
+        # Plan backwards, since each leg's egresses depend on the next leg
+        for line_name, board, alight in reversed(route):
+            line = self.lines[line_name]
+            if next_line is None:
+                leg = line.plan_trip(self.stations[board], self.stations[alight])
+            else:
+                next_leg = legs[-1]
+                leg = line.plan_trip(
+                    self.stations[board],
+                    self.stations[alight],
+                    transfer=True,
+                    transfer_line=next_line,
+                    transfer_direction=next_leg.terminus(next_line),
+                )
+                if not leg.egresses and not TripPlanner.check_directions(
+                    self.lines,
+                    alight,
+                    line_name,
+                    leg.terminus(line_name),
+                    next_line,
+                    next_leg.terminus(next_line),
+                ):
+                    # Board where the next leg's exits are across the platform
+                    leg = replace(
+                        leg, egresses=TripPlanner.same_platform_egresses(next_leg)
+                    )
+            lines = dict(leg.lines)
+            lines.update(self.get_parallel_lines(line_name, board, alight))
+            legs.append(replace(leg, lines=tuple(lines.items())))
+            next_line = line_name
+        legs.reverse()
+        return Trip(tuple(legs))
@@ -0,0 +1,118 @@
+"""Station search for autocomplete.
+
+StationIndex is built once per network from each station's name and aliases
+(the nameAlt and subtitile columns of Stations.csv). A query matches a
+station when every word of it starts a word of the station's names, so
+partly typed words match. Common abbreviations such as "Mt" and "Sq" are
+expanded on both sides, and each multi-word name can also be found by its
+initials. If that finds too few stations, names sharing enough letter
+trigrams with the query are added, which catches most typos.
+"""
+
+import re
+
+from src.stations import Station
+
+ABBREVIATIONS = {
+    "ave": "avenue",
+    "blvd": "boulevard",
+    "ctr": "center",
+    "ft": "fort",
+    "intl": "international",
+    "mem": "memorial",
+    "mt": "mount",
+    "natl": "national",
+    "pl": "place",
+    "rd": "road",
+    "sq": "square",
+    "st": "street",
+}
+# Share of the query's trigrams a name needs for a fuzzy match
+MIN_SIMILARITY = 0.5
+
+
+def words(text: str) -> list[str]:
+    """Lower case words of a name or query, ignoring punctuation."""
+    return re.findall(r"[a-z0-9]+", text.lower().replace("'", ""))
+
+
+def expand(word: str) -> set[str]:
+    """A word and its unabbreviated form, if it has one."""
+    return {word, ABBREVIATIONS.get(word, word)}
+
+
+def trigrams(text: str) -> set[str]:
+    """Three letter pieces of the words, padded so word starts count too."""
+    padded = f"  {' '.join(words(text))} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class StationIndex:
+    """Prefix and trigram index over station names and aliases."""
+
+    def __init__(self, stations: dict[str:Station]):
+        self.names = sorted(stations.keys())
+        # Lower case full names, for ranking names that start with the query
+        self.full_names = [" ".join(words(name)) for name in self.names]
+        # Word prefix to the stations with a word starting with it, first for
+        # the names alone and then for names and aliases together
+        self.name_prefixes = dict()
+        self.prefixes = dict()
+        self.trigrams = dict()
+        for i, name in enumerate(self.names):
+            for label in (name,) + stations[name].aliases:
+                label_words = words(label)
+                index_words = set()
+                for word in label_words:
+                    index_words |= expand(word)
+                if len(label_words) > 1:
+                    index_words.add("".join(word[0] for word in label_words))
+                for word in index_words:
+                    for end in range(1, len(word) + 1):
+                        self.prefixes.setdefault(word[:end], set()).add(i)
+                        if label == name:
+                            self.name_prefixes.setdefault(word[:end], set()).add(i)
+                for trigram in trigrams(label):
+                    self.trigrams.setdefault(trigram, set()).add(i)
+
+    def match(self, prefixes: dict, query_words: list[str]) -> set[int]:
+        """Stations where every query word starts one of the indexed words."""
+        found = None
+        for word in query_words:
+            matches = set()
+            for form in expand(word):
+                matches |= prefixes.get(form, set())
+            found = matches if found is None else found & matches
+            if not found:
+                return set()
+        return found
+
+    def search(self, query: str, limit: int = 10) -> list[str]:
+        """Names of the stations best matching the query, best first."""
+        query_words = words(query)
+        if not query_words or limit <= 0:
+            return []
+        full_query = " ".join(query_words)
+        in_names = self.match(self.name_prefixes, query_words)
+        in_aliases = self.match(self.prefixes, query_words) - in_names
+
+        def rank(i: int) -> tuple:
+            starts = self.full_names[i].startswith(full_query)
+            return (not starts, i not in in_names, self.names[i])
+
+        found = sorted(in_names | in_aliases, key=rank)
+        if len(found) < limit:
+            query_trigrams = trigrams(query)
+            shared = dict()
+            for trigram in query_trigrams:
+                for i in self.trigrams.get(trigram, ()):
+                    shared[i] = shared.get(i, 0) + 1
+            fuzzy = [
+                (-count, self.names[i], i)
+                for i, count in shared.items()
+                if count >= MIN_SIMILARITY * len(query_trigrams)
+                and i not in in_names
+                and i not in in_aliases
+            ]
+            found += [i for _, _, i in sorted(fuzzy)]
+        return [self.names[i] for i in found[:limit]]
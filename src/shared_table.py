@@ -0,0 +1,143 @@
+"""Trip table in a memory-mapped file that gunicorn workers share.
+
+The trip table as Python objects takes about 8MB in every worker. Workers
+forked after --preload start out sharing it, but every lookup updates
+reference counts and so copies the pages it touches into the worker. Here
+each trip is stored as JSON in one file that every worker maps read-only:
+its pages are held once by the OS, and a lookup only decodes the trip it
+returns.
+
+File layout: MAGIC, the length of a JSON header holding the version and
+the sorted station names, the header, padding to 8 bytes, one 8-byte offset
+per ordered pair of stations plus an end offset, then the trips. A pair
+that could not be planned has an empty trip.
+"""
+
+import json
+import mmap
+import os
+from array import array
+from collections.abc import Mapping
+
+from src.lines import Line
+from src.router import Router
+from src.stations import Station
+from src.results import Trip
+from src.trip_table import build_trip_table
+
+MAGIC = b"WMATATT1"
+TRIP_TABLE_PATH = "build/trip_table.bin"
+
+
+class MappedTripTable(Mapping):
+    """Read-only mapping of (start, end) to trip, decoded from a mapped file."""
+
+    def __init__(self, buffer: mmap.mmap):
+        self.buffer = buffer
+        header_length = int.from_bytes(buffer[8:16], "little")
+        header = json.loads(buffer[16 : 16 + header_length])
+        self.version = header["version"]
+        self.names = header["stations"]
+        self.index = {name: i for i, name in enumerate(self.names)}
+        offsets_start = (16 + header_length + 7) // 8 * 8
+        offsets_end = offsets_start + 8 * (len(self.names) ** 2 + 1)
+        # Casting the mapped bytes reads the offsets in place, without a copy
+        self.offsets = memoryview(buffer)[offsets_start:offsets_end].cast("Q")
+        self.trips_start = offsets_end
+
+    @classmethod
+    def open(cls, version: str, path: str = TRIP_TABLE_PATH):
+        """Map the table file, or return None if it is missing or stale."""
+        try:
+            with open(path, "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        if buffer[:8] != MAGIC:
+            return None
+        table = cls(buffer)
+        if table.version != version:
+            return None
+        return table
+
+    def position(self, pair: tuple):
+        """Position of a pair among the offsets, or None for unknown stations."""
+        if not isinstance(pair, tuple) or len(pair) != 2:
+            return None
+        start = self.index.get(pair[0])
+        end = self.index.get(pair[1])
+        if start is None or end is None:
+            return None
+        return start * len(self.names) + end
+
+    def __contains__(self, pair) -> bool:
+        position = self.position(pair)
+        return position is not None and (
+            self.offsets[position] != self.offsets[position + 1]
+        )
+
+    def __getitem__(self, pair: tuple) -> Trip:
+        position = self.position(pair)
+        if position is None:
+            raise KeyError(pair)
+        start = self.trips_start + self.offsets[position]
+        end = self.trips_start + self.offsets[position + 1]
+        if start == end:
+            raise KeyError(pair)
+        return Trip.from_dict(json.loads(self.buffer[start:end]))
+
+    def __iter__(self):
+        for start in self.names:
+            for end in self.names:
+                if (start, end) in self:
+                    yield (start, end)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+def write_trip_table(
+    table: Mapping, names: list[str], version: str, path: str = TRIP_TABLE_PATH
+):
+    """Write a trip table to a file for MappedTripTable."""
+    names = sorted(names)
+    header = json.dumps({"version": version, "stations": names}).encode()
+    offsets = array("Q", [0])
+    trips = bytearray()
+    for start in names:
+        for end in names:
+            if (start, end) in table:
+                trip = table[(start, end)].to_dict()
+                trips += json.dumps(trip, separators=(",", ":")).encode()
+            offsets.append(len(trips))
+    padding = -(16 + len(header)) % 8
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        f.write(bytes(padding))
+        f.write(offsets.tobytes())
+        f.write(trips)
+    # Replace in one step so workers never map a partial file
+    os.replace(tmp_path, path)
+
+
+def load_trip_table(
+    version: str,
+    stations: dict[str:Station],
+    lines: dict[str:Line],
+    router: Router = None,
+    path: str = TRIP_TABLE_PATH,
+) -> MappedTripTable:
+    """Map the trip table file, planning every trip and writing it first if needed.
+
+    The version should identify both the network and the planning engine.
+    """
+    table = MappedTripTable.open(version, path)
+    if table is None:
+        trips = build_trip_table(stations, lines, router)
+        write_trip_table(trips, stations.keys(), version, path)
+        table = MappedTripTable.open(version, path)
+    return table
@@ -0,0 +1,127 @@
+"""Compiled snapshot of the metro network.
+
+Building the network from the CSVs in data/ is slow, so the finished stations
+(with their egresses) and lines are pickled to a snapshot file. The snapshot is keyed by a
+hash of the data files and of the code that builds it, and is rebuilt whenever
+either changes.
+"""
+
+import hashlib
+import importlib
+import os
+import pickle
+import sys
+from glob import glob
+
+from src.metrics import startup_stage
+
+# Set WMATA_DATA_DIR to build the network from CSVs in another directory.
+DATA_DIR = os.environ.get("WMATA_DATA_DIR", "data")
+DATA_FILES = os.path.join(DATA_DIR, "*.csv")
+SOURCE_FILES = "src/*.py"
+SNAPSHOT_PATH = "build/network.pickle"
+
+
+def hash_files(*patterns: str) -> str:
+    """Hash the names and contents of the files matching each pattern."""
+    digest = hashlib.sha256()
+    for pattern in patterns:
+        for path in sorted(glob(pattern)):
+            digest.update(path.encode())
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def network_version() -> str:
+    """Hash the data files and source code the network is built from."""
+    return hash_files(DATA_FILES, SOURCE_FILES)
+
+
+def source_version() -> str:
+    """Hash only the source code the network is built from."""
+    return hash_files(SOURCE_FILES)
+
+
+def build_network(previous: dict = None) -> tuple:
+    """Build stations and lines from the CSV data.
+
+    Unchanged stations of a previous build, if given, are reused.
+    """
+    # The CSVs are read when these modules are imported, so a process that
+    # already built the network once reads them again to see any changes
+    with startup_stage("read_csv"):
+        if "src.compile_data" in sys.modules:
+            importlib.reload(sys.modules["src.wmata_data"])
+            importlib.reload(sys.modules["src.compile_data"])
+        from src.compile_data import get_egresses, get_station_aliases
+    from src.stations import load_all_stations
+    from src.lines import define_all_lines
+
+    with startup_stage("get_egresses"):
+        egresses = get_egresses()
+    with startup_stage("load_all_stations"):
+        stations = load_all_stations(egresses, get_station_aliases(), previous)
+    with startup_stage("define_all_lines"):
+        lines = define_all_lines(stations)
+    return stations, lines
+
+
+def save_snapshot(network: tuple, version: str, path: str = SNAPSHOT_PATH):
+    """Write the network to the snapshot file, after a line with its version."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(f"{version}\n".encode())
+        pickle.dump(network, f, pickle.HIGHEST_PROTOCOL)
+    # Replace in one step so concurrent readers never see a partial file
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(version: str, path: str = SNAPSHOT_PATH) -> tuple:
+    """Read the network from the snapshot file, or None if missing or stale.
+
+    The version is checked before unpickling, so a stale snapshot is never
+    unpickled against code that may have renamed or removed its classes.
+    """
+    try:
+        with open(path, "rb") as f:
+            if f.readline() != f"{version}\n".encode():
+                return None
+            return pickle.load(f)
+    except Exception:
+        # Missing, corrupt, or pickled by code that has since changed
+        return None
+
+
+def load_network(
+    path: str = SNAPSHOT_PATH,
+    rebuild: bool = True,
+    version: str = None,
+    previous: dict = None,
+) -> tuple:
+    """Load the network from the snapshot, rebuilding the snapshot if needed.
+
+    With rebuild=False a missing or stale snapshot is an error instead, so the
+    calling process never imports pandas. previous is passed to build_network.
+    """
+    if version is None:
+        version = network_version()
+    network = load_snapshot(version, path)
+    if network is None:
+        if not rebuild:
+            raise RuntimeError(
+                f"{path} is missing or out of date, run `python -m src.snapshot`"
+            )
+        network = build_network(previous)
+        try:
+            save_snapshot(network, version, path)
+        except OSError:
+            pass
+    return network
+
+
+if __name__ == "__main__":
+    version = network_version()
+    save_snapshot(build_network(), version)
+    print(f"Wrote {SNAPSHOT_PATH} ({version[:12]})")
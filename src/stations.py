@@ -1,32 +1,141 @@
-from src.egresses import get_egresses, Egress
+from collections import defaultdict
+from src.egresses import Egress, EgressTable
+from src.metrics import timed
+from src.results import EgressGroup
+
+# Directions a train can travel along a line
+TRAIN_DIRECTIONS = ("eastbound", "westbound")
+# Stands in for every transfer terminus the station's egresses do not name,
+# as they all select the same egresses
+OTHER_TERMINUS = None
+
+
+def group_egresses(exit_infos: list[dict]) -> tuple[EgressGroup]:
+    """Group exit information by label, each group sorted by car and door."""
+    grouped = defaultdict(list)
+    for egress in exit_infos:
+        grouped[egress["label"]].append(
+            (egress["icon"], egress["car"], egress["door"], egress["preferred"])
+        )
+    return tuple(
+        EgressGroup(label, tuple(sorted(entries, key=lambda x: (x[1], x[2]))))
+        for label, entries in grouped.items()
+    )
 
 
 class Station:
-    def __init__(self, egresses: list[Egress], lines: list[str]):
-        self.egresses = egresses
+    def __init__(self, egresses: list[Egress], lines: list[str], aliases=()):
+        self.egress_table = EgressTable(egresses)
         self.lines = lines
         self.name = egresses[0].station
+        # Other names the station is known by, for search
+        self.aliases = tuple(aliases)
+        self.egress_buckets = self.bucket_egresses()
 
+    def bucket_egresses(self) -> dict[tuple : tuple[EgressGroup]]:
+        """The grouped egresses for every train that can stop here.
 
-def load_all_stations(egresses: list[Egress]) -> dict[str:Station]:
-    """Load all the stations given all egresses."""
-    stations = dict()
-    unique_station_names = set()
+        Keys are (direction, line) for trips ending here, and (direction, line,
+        transfer line, transfer terminus) for transfers, with OTHER_TERMINUS
+        standing in for termini the egresses do not name.
+        """
+        buckets = dict()
+        termini = self.egress_table.termini + [OTHER_TERMINUS]
+        for line in sorted(self.lines):
+            for direction in TRAIN_DIRECTIONS:
+                buckets[(direction, line)] = self.select_egresses(direction, line)
+                for transfer_line in sorted(self.lines):
+                    if transfer_line == line:
+                        continue
+                    for terminus in termini:
+                        key = (direction, line, transfer_line, terminus)
+                        buckets[key] = self.select_egresses(
+                            direction, line, True, transfer_line, terminus
+                        )
+        return buckets
+
+    def select_egresses(
+        self,
+        direction: str,
+        line: str,
+        transfer: bool = False,
+        transfer_line: str = None,
+        transfer_direction: str = None,
+    ) -> tuple[EgressGroup]:
+        """Filter, group and sort the egresses for one train."""
+        table = self.egress_table
+        rows = table.select(
+            direction, line, transfer, transfer_line, transfer_direction
+        )
+        return group_egresses(table.get_exit_info(rows, direction))
+
+    @timed("egress_groups")
+    def egress_groups(
+        self,
+        direction: str,
+        line: str,
+        transfer: bool = False,
+        transfer_line: str = None,
+        transfer_direction: str = None,
+    ) -> tuple[EgressGroup]:
+        """Egresses to use from a train on the line heading in the direction.
+
+        With transfer, only those that are transfer points to the transfer line
+        and direction. Looked up in the buckets made when the station was built.
+        """
+        if not transfer:
+            key = (direction, line)
+        else:
+            if transfer_direction not in self.egress_table.termini:
+                transfer_direction = OTHER_TERMINUS
+            key = (direction, line, transfer_line, transfer_direction)
+        if key in self.egress_buckets:
+            return self.egress_buckets[key]
+        # A line, or transfer line, that does not stop here
+        return self.select_egresses(
+            direction, line, transfer, transfer_line, transfer_direction
+        )
+
+
+def load_all_stations(
+    egresses: list[Egress],
+    aliases: dict[str:tuple] = None,
+    previous: dict[str:Station] = None,
+) -> dict[str:Station]:
+    """Load all the stations given all egresses, and optionally their aliases.
+
+    Stations in previous whose lines, egresses and aliases are unchanged are
+    reused as they are, without sorting their egresses into buckets again.
+    """
+    aliases = aliases or dict()
+    previous = previous or dict()
+    egresses_by_station = defaultdict(list)
+    lines_by_station = defaultdict(set)
     for egress in egresses:
-        unique_station_names.add(egress.station)
-    for station_name in unique_station_names:
-        egresses_for_station = []
-        lines = set()
-        for egress in egresses:
-            if egress.station == station_name:
-                egresses_for_station.append(egress)
-                for l in egress.lines:
-                    lines.add(l)
-        stations[station_name] = Station(egresses_for_station, lines)
+        egresses_by_station[egress.station].append(egress)
+        lines_by_station[egress.station].update(egress.lines)
+    stations = dict()
+    for station_name, egresses_for_station in egresses_by_station.items():
+        station_lines = lines_by_station[station_name]
+        station_aliases = aliases.get(station_name, ())
+        old = previous.get(station_name)
+        if (
+            old is not None
+            and old.lines == station_lines
+            and old.aliases == tuple(station_aliases)
+            and old.egress_table == EgressTable(egresses_for_station)
+        ):
+            stations[station_name] = old
+            continue
+        stations[station_name] = Station(
+            egresses_for_station, station_lines, station_aliases
+        )
     return stations
 
 
 if __name__ == "__main__":
+    from src.compile_data import get_egresses
+
     egresses = get_egresses()
     stations = load_all_stations(egresses)
     print(stations["Metro Center"].__dict__)
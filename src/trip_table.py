@@ -0,0 +1,77 @@
+"""Precomputed trips between every pair of stations."""
+
+from types import MappingProxyType
+from src import metrics
+from src.plan_trip import TripPlanner
+from src.stations import Station
+from src.lines import Line
+from src.results import Trip
+from src.router import Router
+
+
+def build_trip_table(
+    stations: dict[str:Station], lines: dict[str:Line], router: Router = None
+) -> MappingProxyType:
+    """Plan the trip for every ordered pair of stations once.
+
+    Pairs that cannot be planned are left out of the table, so looking them
+    up falls back to live planning (and fails the same way it always has).
+    """
+    table = dict()
+    for start in stations:
+        for end in stations:
+            try:
+                tp = TripPlanner(stations, lines, start, end, router)
+                table[(start, end)] = tp.plan_trip()
+            except Exception:
+                continue
+    return MappingProxyType(table)
+
+
+def trip_stations(trip: Trip) -> set[str]:
+    """Names of every station whose egresses a planned trip was built from."""
+    return {name for leg in trip.legs for name in (leg.start_station, leg.end_station)}
+
+
+def update_trip_table(
+    table: MappingProxyType,
+    stations: dict[str:Station],
+    lines: dict[str:Line],
+    changed: set[str],
+    router: Router = None,
+) -> tuple[MappingProxyType, set[tuple]]:
+    """Replan only the trips that pass through a station in changed.
+
+    Only valid when the stations and lines themselves are the same as when the
+    table was built, so every other trip would be planned the same way again.
+    Returns the new table and the pairs that were replanned.
+    """
+    new_table = dict(table)
+    replanned = set()
+    for pair, trip in table.items():
+        if pair[1] in changed or not changed.isdisjoint(trip_stations(trip)):
+            replanned.add(pair)
+            try:
+                tp = TripPlanner(stations, lines, *pair, router)
+                new_table[pair] = tp.plan_trip()
+            except Exception:
+                del new_table[pair]
+    return MappingProxyType(new_table), replanned
+
+
+def lookup_trip(
+    table: MappingProxyType,
+    stations: dict[str:Station],
+    lines: dict[str:Line],
+    start: str,
+    end: str,
+    router: Router = None,
+) -> Trip:
+    """Return the trip between two stations, planning it live if not in the table."""
+    if table is not None and (start, end) in table:
+        if metrics.ENABLED:
+            metrics.record_cache("trip_table", hit=True)
+        return table[(start, end)]
+    if metrics.ENABLED:
+        metrics.record_cache("trip_table", hit=False)
+    return TripPlanner(stations, lines, start, end, router).plan_trip()
@@ -1,11 +1,29 @@
 """Import data for application."""
 
+import os
+
 import pandas as pd
 
-doors = pd.read_csv("data/Doors.csv")
+from src.metrics import startup_stage
+from src.snapshot import DATA_DIR
+
+DOORS_CSV = os.path.join(DATA_DIR, "Doors.csv")
+EGRESSES_CSV = os.path.join(DATA_DIR, "Egresses.csv")
+EXITS_CSV = os.path.join(DATA_DIR, "Exits.csv")
+STATIONS_CSV = os.path.join(DATA_DIR, "Stations.csv")
+LINES_CSV = os.path.join(DATA_DIR, "Lines.csv")
+
+with startup_stage("read_csv.Doors"):
+    doors = pd.read_csv(DOORS_CSV)
+
+with startup_stage("read_csv.Egresses"):
+    egresses = pd.read_csv(EGRESSES_CSV)
 
-egresses = pd.read_csv("data/Egresses.csv")
+with startup_stage("read_csv.Exits"):
+    exits = pd.read_csv(EXITS_CSV)
 
-exits = pd.read_csv("data/Exits.csv")
+with startup_stage("read_csv.Stations"):
+    stations = pd.read_csv(STATIONS_CSV)
 
-stations = pd.read_csv("data/Stations.csv")
+with startup_stage("read_csv.Lines"):
+    lines = pd.read_csv(LINES_CSV)